@@ -0,0 +1,66 @@
+import logging
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logging_config import request_id_var
+
+
+class AccessLogMiddleware:
+    """
+    Request-id для корреляции логов и access-лог (семплируется по LOG_SAMPLE_RATES).
+
+    Обычный ASGI middleware: без задачи и потоков ответа, которые добавляет
+    BaseHTTPMiddleware (@app.middleware("http")) на каждый запрос.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        method, path = scope["method"], scope["path"]
+        access_logger = logging.getLogger(f"app.access.{method}")
+        extra = {"method": method, "path": path}
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        try:
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            except Exception:
+                access_logger.exception("Unhandled error", extra={**extra, "status": 500})
+                raise
+
+            if status_code >= 500:
+                level = logging.ERROR
+            elif status_code >= 400:
+                level = logging.WARNING
+            else:
+                level = logging.INFO
+            if access_logger.isEnabledFor(level):
+                access_logger.log(
+                    level,
+                    f"{method} {path} {status_code}",
+                    extra={
+                        **extra,
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    }
+                )
+        finally:
+            request_id_var.reset(token)
@@ -25,7 +25,9 @@ def get_database_url():
 
 DATABASE_URL = get_database_url()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# SQL-логи включаются через SQL_ECHO в app/logging_config.py: echo=True
+# добавляет синхронный обработчик stdout в обход очереди логирования
+engine = create_async_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
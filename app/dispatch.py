@@ -0,0 +1,48 @@
+from collections import deque
+from typing import Deque
+import asyncio
+
+from app.metrics import metrics
+
+
+class PendingRideWaiters:
+    """
+    Очередь водителей, ждущих новый заказ (long-poll).
+
+    Каждая новая поездка будит только одного, дольше всех ждущего водителя,
+    а не всех сразу: иначе сотни водителей одновременно шли бы в БД за одной
+    поездкой. Поездки, созданные другими экземплярами, подхватываются
+    периодическим повтором запроса.
+    """
+
+    def __init__(self):
+        self._waiters: Deque[asyncio.Future] = deque()
+        metrics.gauge("dispatch.waiting_drivers", lambda: len(self._waiters))
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def notify(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def wait(self, timeout: float):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Не разбуженного (таймаут, отмена запроса) убираем из очереди сразу;
+            # разбуженный уже извлечен в notify
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+
+pending_ride_waiters = PendingRideWaiters()
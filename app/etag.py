@@ -0,0 +1,71 @@
+from hashlib import sha1
+from typing import Dict, List
+import threading
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+
+from app.metrics import metrics
+
+# Частные ответы: прокси не кешируют, клиент перепроверяет через If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+_lock = threading.Lock()
+_stats: Dict[str, List[int]] = {}  # ресурс -> [проверок, 304]
+
+
+def version_columns(model, condition) -> list:
+    """
+    Версия набора строк: количество, максимальный id и сумма version.
+    Любое изменение строки увеличивает version, поэтому сумма меняется
+    без сравнения часов разных экземпляров.
+    """
+    return [
+        select(func.count(model.id)).where(condition).scalar_subquery(),
+        select(func.max(model.id)).where(condition).scalar_subquery(),
+        select(func.coalesce(func.sum(model.version), 0)).where(condition).scalar_subquery(),
+    ]
+
+
+def make_etag(*parts) -> str:
+    """
+    Сильный ETag из параметров запроса и версий строк
+    """
+    return '"' + sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def _record(resource: str, hit: bool):
+    with _lock:
+        stats = _stats.get(resource)
+        if stats is None:
+            stats = _stats[resource] = [0, 0]
+            metrics.gauge(f"etag.{resource}.hit_rate", lambda: round(stats[1] / stats[0], 4) if stats[0] else 0.0)
+        stats[0] += 1
+        if hit:
+            stats[1] += 1
+    metrics.inc(f"etag.{resource}.{'hits' if hit else 'misses'}")
+
+
+def is_not_modified(request: Request, etag: str, resource: str) -> bool:
+    """
+    Совпадает ли If-None-Match с текущим ETag (сравнение слабое, как требует RFC 9110)
+    """
+    header = request.headers.get("if-none-match")
+    hit = False
+    if header:
+        candidates = [value.strip() for value in header.split(",")]
+        hit = "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+    _record(resource, hit)
+    return hit
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    )
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,39 @@
+from pydantic import BaseModel
+import logging
+
+from app.tasks import task_queue
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReceipt(BaseModel):
+    payment_id: int
+    ride_id: int
+    user_id: int
+    amount: float
+    payment_method: str
+
+
+class DriverAssigned(BaseModel):
+    ride_id: int
+    driver_id: int
+    user_id: int
+
+
+@task_queue.register("payment_receipt", PaymentReceipt, concurrency=4, durable=True)
+async def send_payment_receipt(receipt: PaymentReceipt):
+    """
+    Отправка квитанции об оплате
+    """
+    logger.info(
+        f"Receipt for payment {receipt.payment_id}: ride {receipt.ride_id}, "
+        f"{receipt.amount:.2f} ({receipt.payment_method}) to user {receipt.user_id}"
+    )
+
+
+@task_queue.register("driver_assigned", DriverAssigned, concurrency=8)
+async def notify_driver_assigned(event: DriverAssigned):
+    """
+    Уведомление о назначении водителя на поездку
+    """
+    logger.info(f"Driver {event.driver_id} assigned to ride {event.ride_id} of user {event.user_id}")
@@ -0,0 +1,178 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import heapq
+import os
+
+from sqlalchemy import select, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Ride
+
+# Префиксы, с которых начинается больше мест, получают заранее посчитанный топ по частоте;
+# для остальных просматривается весь диапазон (не больше стольких мест)
+SUGGEST_SCAN_LIMIT = int(os.getenv("LOCATION_SUGGEST_SCAN_LIMIT", "500"))
+# Размер топа для частых префиксов (не меньше максимального limit в /locations/suggest)
+SUGGEST_TOP_SIZE = 50
+# Сколько последних мест помним для каждого пользователя
+RECENT_PLACES_PER_USER = int(os.getenv("LOCATION_RECENT_PLACES", "20"))
+# Во сколько раз недавнее место пользователя важнее глобальной частоты
+RECENT_PLACE_BOOST = float(os.getenv("LOCATION_RECENT_BOOST", "1000"))
+# Сколько последних поездок читаем при старте, чтобы восстановить недавние места
+RECENT_RIDES_WARMUP = int(os.getenv("LOCATION_RECENT_WARMUP_RIDES", "10000"))
+
+
+# Больше любого символа ключа: граница диапазона ключей с общим префиксом
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def normalize_location(location: str) -> str:
+    """
+    Ключ индекса: без лишних пробелов и без учета регистра
+    """
+    return " ".join(location.split()).casefold()
+
+
+class LocationIndex:
+    """
+    Префиксный индекс известных мест (отсортированный массив + бинарный поиск).
+
+    Хранит частоту каждого места по всем поездкам и список недавних мест
+    каждого пользователя. Обновляется инкрементально при создании поездки.
+
+    Для префиксов, под которые попадает больше SUGGEST_SCAN_LIMIT мест (первые
+    символы ввода), хранится топ SUGGEST_TOP_SIZE мест по частоте; частоты только
+    растут, поэтому топ поддерживается при каждом добавлении без пересчета.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._labels: Dict[str, str] = {}
+        self._counts: Dict[str, int] = {}
+        self._recent: Dict[int, "OrderedDict[str, None]"] = {}
+        self._top: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = []
+        self._labels = {}
+        self._counts = {}
+        self._recent = {}
+        self._top = {}
+
+    def add(self, location: str, user_id: Optional[int] = None, count: int = 1):
+        key = normalize_location(location)
+        if not key:
+            return
+        if key in self._counts:
+            self._counts[key] += count
+        else:
+            insort(self._keys, key)
+            self._counts[key] = count
+            self._labels[key] = " ".join(location.split())
+        self._update_top(key)
+        if user_id is not None:
+            self._touch_recent(user_id, key)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self._keys, prefix), bisect_left(self._keys, prefix + _MAX_CHAR)
+
+    def _update_top(self, key: str):
+        """
+        Учесть новую частоту места в топах его префиксов. Диапазон префикса не
+        больше диапазона более короткого, поэтому на первом "легком" префиксе
+        можно остановиться.
+        """
+        for length in range(len(key) + 1):
+            prefix = key[:length]
+            top = self._top.get(prefix)
+            if top is None:
+                start, end = self._range(prefix)
+                if end - start <= SUGGEST_SCAN_LIMIT:
+                    break
+                self._top[prefix] = heapq.nlargest(
+                    SUGGEST_TOP_SIZE, self._keys[start:end], key=self._counts.__getitem__
+                )
+                continue
+            if key not in top:
+                if len(top) >= SUGGEST_TOP_SIZE and self._counts[key] <= self._counts[top[-1]]:
+                    continue
+                top.append(key)
+            top.sort(key=self._counts.__getitem__, reverse=True)
+            del top[SUGGEST_TOP_SIZE:]
+
+    def _touch_recent(self, user_id: int, key: str):
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = OrderedDict()
+        recent[key] = None
+        recent.move_to_end(key)
+        while len(recent) > RECENT_PLACES_PER_USER:
+            recent.popitem(last=False)
+
+    def suggest(
+        self, prefix: str, user_id: Optional[int] = None, limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        """
+        Места, начинающиеся с prefix, по убыванию веса (частота + недавние места пользователя)
+        """
+        query = normalize_location(prefix)
+        recent = self._recent.get(user_id) if user_id is not None else None
+        recent_rank = {key: rank for rank, key in enumerate(recent)} if recent else {}
+
+        def score(key: str) -> float:
+            weight = float(self._counts[key])
+            rank = recent_rank.get(key)
+            if rank is not None:
+                # Более свежие места получают больший бонус
+                weight += RECENT_PLACE_BOOST * (rank + 1)
+            return weight
+
+        top = self._top.get(query)
+        if top is not None:
+            candidates = set(top)
+        else:
+            # Префикс без топа покрывает не больше SUGGEST_SCAN_LIMIT мест
+            start, end = self._range(query)
+            candidates = set(self._keys[start:end])
+
+        # Недавние места пользователя могут не входить в топ по частоте
+        for key in recent_rank:
+            if key.startswith(query):
+                candidates.add(key)
+
+        best = heapq.nlargest(limit, candidates, key=score)
+        return [(self._labels[key], self._counts[key]) for key in best]
+
+    async def load(self, db: AsyncSession):
+        """
+        Построение индекса из поездок: частоты через GROUP BY, недавние места
+        из последних поездок
+        """
+        places = union_all(
+            select(Ride.pickup_location.label("location")),
+            select(Ride.dropoff_location.label("location")),
+        ).subquery()
+        result = await db.execute(
+            select(places.c.location, func.count()).group_by(places.c.location)
+        )
+        self.clear()
+        for location, count in result.all():
+            self.add(location, count=count)
+
+        result = await db.execute(
+            select(Ride.user_id, Ride.pickup_location, Ride.dropoff_location)
+            .order_by(Ride.id.desc())
+            .limit(RECENT_RIDES_WARMUP)
+        )
+        # Идем от старых к новым, чтобы последние поездки оказались самыми свежими
+        for user_id, pickup, dropoff in reversed(result.all()):
+            for location in (pickup, dropoff):
+                key = normalize_location(location)
+                if key in self._counts:
+                    self._touch_recent(user_id, key)
+
+
+location_index = LocationIndex()
@@ -0,0 +1,210 @@
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+from app.metrics import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Сколько ждать при остановке освобождения места в очереди и завершения потока
+LOG_STOP_TIMEOUT_SECONDS = float(os.getenv("LOG_STOP_TIMEOUT_SECONDS", "5"))
+# Доля записей ниже WARNING, которые пишем для логгера (и его потомков)
+# Формат: "app.access.GET=0.01,sqlalchemy.engine=0.1"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "app.access.GET=0.01")
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Стандартные атрибуты LogRecord, все остальное считается extra-полями
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {
+    "message", "asctime", "request_id",
+}
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Добавляет в запись request_id текущего запроса
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только часть записей ниже WARNING; ошибки и предупреждения пишутся всегда
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            # Ищем самое длинное совпадение по иерархии имен логгеров
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        metrics.inc("logging.sampled_out")
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Структурированный JSON в одну строку (severity понимает Cloud Logging)
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладет записи в ограниченную очередь; при переполнении запись отбрасывается
+    и учитывается в метриках, а не блокирует event loop
+    """
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("logging.dropped")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование JSON делает поток слушателя; здесь только то,
+        # что нельзя передать в другой поток (args, traceback)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    Слушатель, который останавливается и при заполненной очереди: маркер
+    остановки ждет места, а если stdout так и не освободился - вытесняет
+    самые старые записи (они учитываются как отброшенные)
+    """
+
+    def __init__(self, *args, stop_timeout: float = LOG_STOP_TIMEOUT_SECONDS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stop_timeout = stop_timeout
+
+    def enqueue_sentinel(self):
+        try:
+            self.queue.put(self._sentinel, timeout=self.stop_timeout)
+            return
+        except queue.Full:
+            pass
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                metrics.inc("logging.dropped")
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(self._sentinel)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        self.enqueue_sentinel()
+        # Поток-демон: если обработчик завис совсем, не блокируем остановку процесса
+        self._thread.join(self.stop_timeout)
+        self._thread = None
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> QueueListener:
+    """
+    Настройка логирования: root -> очередь -> поток слушателя -> stdout
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    metrics.gauge("logging.queue_depth", log_queue.qsize)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    # SQL пишется через тот же неблокирующий обработчик, а не через echo движка
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if SQL_ECHO else logging.WARNING)
+
+    _listener = DrainingQueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """
+    Дописать оставшиеся записи и остановить поток слушателя
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
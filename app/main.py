@@ -1,34 +1,55 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
+import asyncio
 import logging
-import sys
 
-from app.database import init_db
-from app.routers import auth, rides, drivers, cars, payments
+from app.database import init_db, async_session_maker
+from app.logging_config import setup_logging, stop_logging
+from app.access_log import AccessLogMiddleware
+from app.locations import location_index
+from app.metrics import metrics
+from app.tasks import task_queue
+from app.tracking import location_tracker
+from app.surge import surge_engine
+from app.routing import ROAD_GRAPH_PATH, routing_engine
+from app import jobs  # noqa: F401  регистрация фоновых задач
+from app.routers import auth, rides, drivers, cars, payments, locations, pricing, routing
 
-# Настройка логирования для Cloud Run
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(levelname)s: %(message)s',
-    stream=sys.stdout
-)
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # Логирование для Cloud Run: JSON через очередь и отдельный поток;
+    # запускается и останавливается вместе с приложением
+    setup_logging()
     logger.info("Starting application...")
     try:
         await init_db()
         logger.info("Database initialized successfully")
+        async with async_session_maker() as session:
+            await location_index.load(session)
+        logger.info(f"Location index loaded: {len(location_index)} places")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         # Не падаем при ошибке БД - дадим сервису запуститься
         # и показать ошибку через API
+    if ROAD_GRAPH_PATH:
+        try:
+            await asyncio.to_thread(routing_engine.load, ROAD_GRAPH_PATH)
+        except Exception as e:
+            logger.error(f"Failed to load road graph: {e}")
+    await task_queue.start()
+    location_tracker.start()
+    surge_engine.start()
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await surge_engine.stop()
+    await location_tracker.stop()
+    await task_queue.drain()
+    stop_logging()
 
 
 app = FastAPI(
@@ -38,12 +59,19 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+app.add_middleware(AccessLogMiddleware)
+
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(rides.router, prefix="/rides", tags=["Rides"])
 app.include_router(drivers.router, prefix="/drivers", tags=["Drivers"])
 app.include_router(cars.router, prefix="/cars", tags=["Cars"])
 app.include_router(payments.router, prefix="/payments", tags=["Payments"])
+app.include_router(locations.router, prefix="/locations", tags=["Locations"])
+app.include_router(pricing.router, prefix="/pricing", tags=["Pricing"])
+app.include_router(routing.router, prefix="/routing", tags=["Routing"])
 
 
 @app.get("/", tags=["Root"])
@@ -61,3 +89,11 @@ async def health():
     Health check endpoint для Cloud Run startup probe
     """
     return {"status": "ok"}
+
+
+@app.get("/metrics", tags=["Health"])
+async def get_metrics():
+    """
+    Метрики процесса: счетчики, глубина очередей, задержки
+    """
+    return metrics.snapshot()
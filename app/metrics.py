@@ -0,0 +1,76 @@
+from collections import deque
+from typing import Callable, Deque, Dict
+import threading
+
+
+class LatencyStats:
+    """
+    Счетчик задержек: количество, сумма, максимум и скользящая выборка для перцентилей
+    """
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(percentile(0.50) * 1000, 3),
+            "p99_ms": round(percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """
+    Простой реестр метрик процесса: счетчики, gauge-функции и задержки
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._latencies: Dict[str, LatencyStats] = {}
+
+    def inc(self, name: str, value: int = 1):
+        # Счетчики могут увеличиваться из потоков (например, логирования)
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        stats = self._latencies.get(name)
+        if stats is None:
+            stats = self._latencies[name] = LatencyStats()
+        stats.observe(seconds)
+
+    def gauge(self, name: str, func: Callable[[], float]):
+        self._gauges[name] = func
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "gauges": {name: func() for name, func in self._gauges.items()},
+            "latencies": {name: stats.snapshot() for name, stats in self._latencies.items()},
+        }
+
+
+metrics = Metrics()
@@ -1,9 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 
+def version_column() -> Column:
+    """
+    Счетчик изменений строки для ETag: увеличивается в самом UPDATE
+    (и в ORM, и в update() из Core)
+    """
+    return Column(Integer, nullable=False, default=1, onupdate=literal_column("version") + 1)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -27,6 +35,7 @@ class Driver(Base):
     rating = Column(Float, default=5.0)
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = version_column()
 
     cars = relationship("Car", back_populates="driver")
     rides = relationship("Ride", back_populates="driver")
@@ -42,22 +51,33 @@ class Car(Base):
     color = Column(String)
     year = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = version_column()
 
     driver = relationship("Driver", back_populates="cars")
 
 
 class Ride(Base):
     __tablename__ = "rides"
+    __table_args__ = (
+        # Очередь ожидающих поездок для claim-next
+        Index("ix_rides_status_created_at", "status", "created_at"),
+        # Проверка версии списка поездок пользователя только по индексу
+        Index("ix_rides_user_id_id_version", "user_id", "id", "version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=True)
     pickup_location = Column(String, nullable=False)
     dropoff_location = Column(String, nullable=False)
+    pickup_latitude = Column(Float, nullable=True)
+    pickup_longitude = Column(Float, nullable=True)
     status = Column(String, default="pending")  # pending, in_progress, completed, cancelled
     price = Column(Float, nullable=True)
+    surge_multiplier = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    version = version_column()
 
     user = relationship("User", back_populates="rides")
     driver = relationship("Driver", back_populates="rides")
@@ -66,6 +86,9 @@ class Ride(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_user_id_id_version", "user_id", "id", "version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ride_id = Column(Integer, ForeignKey("rides.id"), nullable=False)
@@ -74,6 +97,62 @@ class Payment(Base):
     payment_method = Column(String, nullable=False)  # card, cash
     status = Column(String, default="pending")  # pending, completed, failed
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = version_column()
 
     ride = relationship("Ride", back_populates="payment")
     user = relationship("User", back_populates="payments")
+
+
+class DriverPosition(Base):
+    """
+    Последняя известная позиция водителя (пишется пакетно из app/tracking.py)
+    """
+    __tablename__ = "driver_positions"
+
+    driver_id = Column(Integer, ForeignKey("drivers.id"), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    heading = Column(Float, nullable=True)
+    speed = Column(Float, nullable=True)
+    recorded_at = Column(DateTime, nullable=False)
+
+
+class DriverLocationHistory(Base):
+    """
+    Прореженный трек водителя
+    """
+    __tablename__ = "driver_location_history"
+    __table_args__ = (
+        Index("ix_driver_location_history_driver_recorded", "driver_id", "recorded_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+
+class SurgeCounter(Base):
+    """
+    Окно спроса/предложения экземпляра сервиса по зоне (для SURGE_STORE=database)
+    """
+    __tablename__ = "surge_counters"
+
+    instance_id = Column(String, primary_key=True)
+    zone = Column(String, primary_key=True)
+    demand = Column(Integer, nullable=False)
+    supply_driver_ids = Column(Text, nullable=False)  # JSON
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TaskOutbox(Base):
+    __tablename__ = "task_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_name = Column(String, nullable=False, index=True)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, default="pending")  # pending, failed
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,44 @@
+from fastapi import HTTPException, status
+from typing import List, Optional, Set
+
+# Максимум идентификаторов в одном пакетном запросе
+MAX_BATCH_IDS = 100
+
+RIDE_EXPANSIONS = {"driver", "car", "payment"}
+
+
+def parse_id_list(ids: Optional[str]) -> Optional[List[int]]:
+    """
+    Разбор параметра вида ids=1,2,3
+    """
+    if ids is None:
+        return None
+    try:
+        values = sorted({int(value) for value in ids.split(",") if value.strip()})
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers"
+        )
+    if len(values) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} ids per request"
+        )
+    return values
+
+
+def parse_expand(expand: Optional[str]) -> Set[str]:
+    """
+    Разбор параметра вида expand=driver,car,payment
+    """
+    if not expand:
+        return set()
+    values = {value.strip() for value in expand.split(",") if value.strip()}
+    unknown = values - RIDE_EXPANSIONS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown expand values: {', '.join(sorted(unknown))}"
+        )
+    return values
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.models import Car, Driver, User
 from app.schemas import CarCreate, CarResponse
 from app.auth import get_current_user
+from app.params import parse_id_list
+from app.etag import is_not_modified, make_etag, not_modified, set_etag
 
 router = APIRouter()
 
@@ -53,17 +55,38 @@ async def create_car(
 
 @router.get("/", response_model=List[CarResponse])
 async def get_cars(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    ids: Optional[str] = None,
+    driver_ids: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Получить список автомобилей
+    Получить список автомобилей (или пакетно по ids=1,2,3 / driver_ids=1,2,3)
     """
-    result = await db.execute(
-        select(Car).offset(skip).limit(limit)
-    )
+    car_ids = parse_id_list(ids)
+    owner_ids = parse_id_list(driver_ids)
+    query = select(Car).order_by(Car.id)
+    if car_ids is None and owner_ids is None:
+        query = query.offset(skip).limit(limit)
+    else:
+        # Пакетная выборка: skip/limit не применяются
+        if car_ids is not None:
+            query = query.where(Car.id.in_(car_ids))
+        if owner_ids is not None:
+            query = query.where(Car.driver_id.in_(owner_ids))
+
+    # Версии только строк запрошенной страницы
+    result = await db.execute(query.with_only_columns(Car.id, Car.version))
+    etag = make_etag("cars", skip, limit, car_ids, owner_ids, result.all())
+    if is_not_modified(request, etag, "cars"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(query)
     cars = result.scalars().all()
     return cars
 
@@ -71,19 +94,27 @@ async def get_cars(
 @router.get("/{car_id}", response_model=CarResponse)
 async def get_car(
     car_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получить информацию о конкретном автомобиле
     """
-    result = await db.execute(select(Car).where(Car.id == car_id))
-    car = result.scalar_one_or_none()
+    result = await db.execute(select(Car.version).where(Car.id == car_id))
+    version = result.scalar_one_or_none()
     
-    if not car:
+    if version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Car not found"
         )
     
-    return car
+    etag = make_etag("car", car_id, version)
+    if is_not_modified(request, etag, "car"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(select(Car).where(Car.id == car_id))
+    return result.scalar_one()
@@ -1,15 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
+import os
+import time
 
 from app.database import get_db
-from app.models import Driver, User
-from app.schemas import DriverCreate, DriverResponse
-from app.auth import get_current_user
+from app.models import Driver, DriverPosition, Ride, User
+from app.schemas import (
+    DriverCreate,
+    DriverLocationResponse,
+    DriverResponse,
+    LocationAccepted,
+    LocationPing,
+    LocationPingBatch,
+    RideResponse,
+    TokenData
+)
+from app.auth import get_current_user, get_token_data
+from app.tracking import Position, location_tracker, to_naive_utc
+from app.surge import surge_engine
+from app.dispatch import pending_ride_waiters
+from app.jobs import DriverAssigned
+from app.metrics import metrics
+from app.tasks import task_queue
+from app.etag import is_not_modified, make_etag, not_modified, set_etag
+from app.params import parse_id_list
 
 router = APIRouter()
 
+# Как часто ждущий водитель повторяет попытку (поездки с других экземпляров)
+CLAIM_POLL_SECONDS = float(os.getenv("CLAIM_POLL_SECONDS", "2"))
+
 
 @router.post("/", response_model=DriverResponse, status_code=status.HTTP_201_CREATED)
 async def create_driver(
@@ -43,20 +65,37 @@ async def create_driver(
 
 @router.get("/", response_model=List[DriverResponse])
 async def get_drivers(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
     available_only: bool = False,
+    ids: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Получить список водителей
+    Получить список водителей (или пакетно по ids=1,2,3)
     """
-    query = select(Driver)
+    driver_ids = parse_id_list(ids)
+    query = select(Driver).order_by(Driver.id)
     if available_only:
         query = query.where(Driver.is_available == True)
     
-    result = await db.execute(query.offset(skip).limit(limit))
+    if driver_ids is not None:
+        # Пакетная выборка: skip/limit не применяются
+        query = query.where(Driver.id.in_(driver_ids))
+    else:
+        query = query.offset(skip).limit(limit)
+
+    # Версии только строк запрошенной страницы, а не всей таблицы
+    result = await db.execute(query.with_only_columns(Driver.id, Driver.version))
+    etag = make_etag("drivers", skip, limit, available_only, driver_ids, result.all())
+    if is_not_modified(request, etag, "drivers"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(query)
     drivers = result.scalars().all()
     return drivers
 
@@ -64,19 +103,195 @@ async def get_drivers(
 @router.get("/{driver_id}", response_model=DriverResponse)
 async def get_driver(
     driver_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получить информацию о конкретном водителе
     """
+    result = await db.execute(select(Driver.version).where(Driver.id == driver_id))
+    version = result.scalar_one_or_none()
+    
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Driver not found"
+        )
+    
+    etag = make_etag("driver", driver_id, version)
+    if is_not_modified(request, etag, "driver"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     result = await db.execute(select(Driver).where(Driver.id == driver_id))
+    return result.scalar_one()
+
+
+def _to_position(ping: LocationPing) -> Position:
+    return Position(
+        latitude=ping.latitude,
+        longitude=ping.longitude,
+        recorded_at=to_naive_utc(ping.recorded_at),
+        heading=ping.heading,
+        speed=ping.speed
+    )
+
+
+async def _record_pings(db: AsyncSession, driver_id: int, pings: List[LocationPing]) -> int:
+    if not await location_tracker.ensure_driver(db, driver_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Driver not found"
+        )
+    accepted = location_tracker.record(driver_id, [_to_position(ping) for ping in pings])
+    position = location_tracker.current(driver_id)
+    surge_engine.record_supply(driver_id, position.latitude, position.longitude)
+    return accepted
+
+
+@router.post(
+    "/{driver_id}/location",
+    response_model=LocationAccepted,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def report_location(
+    driver_id: int,
+    ping: LocationPing,
+    token_data: TokenData = Depends(get_token_data),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Принять GPS-точку водителя (запись в БД пакетно, в фоне)
+    """
+    return LocationAccepted(accepted=await _record_pings(db, driver_id, [ping]))
+
+
+@router.post(
+    "/{driver_id}/locations",
+    response_model=LocationAccepted,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def report_locations(
+    driver_id: int,
+    batch: LocationPingBatch,
+    token_data: TokenData = Depends(get_token_data),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Принять пакет GPS-точек, накопленных приложением водителя
+    """
+    return LocationAccepted(accepted=await _record_pings(db, driver_id, batch.pings))
+
+
+@router.get("/{driver_id}/location", response_model=DriverLocationResponse)
+async def get_driver_location(
+    driver_id: int,
+    token_data: TokenData = Depends(get_token_data),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Текущая позиция водителя: из памяти, иначе последняя сохраненная в БД
+    """
+    position = location_tracker.current(driver_id)
+    if position is not None:
+        return DriverLocationResponse(
+            driver_id=driver_id,
+            latitude=position.latitude,
+            longitude=position.longitude,
+            heading=position.heading,
+            speed=position.speed,
+            recorded_at=position.recorded_at
+        )
+
+    result = await db.execute(
+        select(DriverPosition).where(DriverPosition.driver_id == driver_id)
+    )
+    stored = result.scalar_one_or_none()
+    if not stored:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Driver location not found"
+        )
+    return stored
+
+
+async def _claim_pending_ride(db: AsyncSession, driver_id: int) -> Optional[Ride]:
+    """
+    Одна транзакция: блокировка водителя, выбор самой старой свободной поездки
+    с SKIP LOCKED (чужие захваты не ждем), назначение и смена статусов
+    """
+    result = await db.execute(
+        select(Driver).where(Driver.id == driver_id).with_for_update()
+    )
     driver = result.scalar_one_or_none()
-    
     if not driver:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Driver not found"
         )
-    
-    return driver
+    if not driver.is_available:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Driver is not available"
+        )
+
+    result = await db.execute(
+        select(Ride)
+        .where(Ride.status == "pending", Ride.driver_id.is_(None))
+        .order_by(Ride.created_at, Ride.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    ride = result.scalar_one_or_none()
+    if not ride:
+        # Освобождаем соединение на время ожидания
+        await db.rollback()
+        return None
+
+    ride.driver_id = driver.id
+    ride.status = "in_progress"
+    driver.is_available = False
+    await db.commit()
+    await db.refresh(ride)
+    return ride
+
+
+@router.post(
+    "/{driver_id}/claim-next",
+    response_model=RideResponse,
+    responses={204: {"description": "No pending rides within the wait time"}}
+)
+async def claim_next_ride(
+    driver_id: int,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Водитель забирает самую старую ожидающую поездку; с wait>0 ждет новую (long-poll).
+    Водители не связаны с пользователями, поэтому вызывающий не проверяется на соответствие driver_id.
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + wait
+    while True:
+        ride = await _claim_pending_ride(db, driver_id)
+        if ride:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            metrics.inc("dispatch.claim_empty")
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        await pending_ride_waiters.wait(min(remaining, CLAIM_POLL_SECONDS))
+
+    metrics.inc("dispatch.claimed")
+    metrics.observe("dispatch.claim", time.perf_counter() - started)
+    await task_queue.enqueue("driver_assigned", DriverAssigned(
+        ride_id=ride.id,
+        driver_id=driver_id,
+        user_id=ride.user_id
+    ))
+    return ride
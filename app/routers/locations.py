@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List
+
+from app.schemas import LocationSuggestion, TokenData
+from app.auth import get_token_data
+from app.locations import location_index
+
+router = APIRouter()
+
+
+@router.get("/suggest", response_model=List[LocationSuggestion])
+async def suggest_locations(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Подсказки адресов по префиксу (из памяти, без запросов к БД; пользователь - из JWT)
+    """
+    return [
+        LocationSuggestion(location=location, count=count)
+        for location, count in location_index.suggest(q, user_id=token_data.user_id, limit=limit)
+    ]
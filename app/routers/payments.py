@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
@@ -7,6 +7,9 @@ from app.database import get_db
 from app.models import Payment, Ride, User
 from app.schemas import PaymentCreate, PaymentResponse
 from app.auth import get_current_user
+from app.jobs import PaymentReceipt
+from app.tasks import task_queue
+from app.etag import is_not_modified, make_etag, not_modified, set_etag, version_columns
 
 router = APIRouter()
 
@@ -54,13 +57,27 @@ async def create_payment(
         status="completed"
     )
     db.add(db_payment)
+    # id платежа нужен для квитанции, которая сохраняется в той же транзакции
+    await db.flush()
+    receipt = PaymentReceipt(
+        payment_id=db_payment.id,
+        ride_id=db_payment.ride_id,
+        user_id=db_payment.user_id,
+        amount=db_payment.amount,
+        payment_method=db_payment.payment_method
+    )
+    receipt_outbox = task_queue.add_to_outbox(db, "payment_receipt", receipt)
     await db.commit()
     await db.refresh(db_payment)
+
+    await task_queue.enqueue("payment_receipt", receipt, outbox=receipt_outbox)
     return db_payment
 
 
 @router.get("/", response_model=List[PaymentResponse])
 async def get_payments(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
     current_user: User = Depends(get_current_user),
@@ -69,6 +86,14 @@ async def get_payments(
     """
     Получить список платежей текущего пользователя
     """
+    result = await db.execute(
+        select(*version_columns(Payment, Payment.user_id == current_user.id))
+    )
+    etag = make_etag("payments", current_user.id, skip, limit, *result.one())
+    if is_not_modified(request, etag, "payments"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     result = await db.execute(
         select(Payment)
         .where(Payment.user_id == current_user.id)
@@ -82,25 +107,36 @@ async def get_payments(
 @router.get("/{payment_id}", response_model=PaymentResponse)
 async def get_payment(
     payment_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получить информацию о конкретном платеже
     """
-    result = await db.execute(select(Payment).where(Payment.id == payment_id))
-    payment = result.scalar_one_or_none()
+    # Сначала только владелец и версия; полная загрузка - если ETag не совпал
+    result = await db.execute(
+        select(Payment.user_id, Payment.version).where(Payment.id == payment_id)
+    )
+    row = result.one_or_none()
     
-    if not payment:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Payment not found"
         )
     
-    if payment.user_id != current_user.id:
+    if row.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this payment"
         )
     
-    return payment
+    etag = make_etag("payment", payment_id, row.version)
+    if is_not_modified(request, etag, "payment"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(select(Payment).where(Payment.id == payment_id))
+    return result.scalar_one()
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+
+from app.models import User
+from app.schemas import SurgeZoneResponse
+from app.auth import get_current_user
+from app.surge import surge_engine, zone_for
+
+router = APIRouter()
+
+
+@router.get("/surge", response_model=List[SurgeZoneResponse])
+async def get_surge(
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Текущие surge-множители: для точки (latitude/longitude) или по всем активным зонам
+    """
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="latitude and longitude must be passed together"
+        )
+    if latitude is not None:
+        zone = zone_for(latitude, longitude)
+        demand, supply = surge_engine.zone_counts(zone)
+        return [SurgeZoneResponse(
+            zone=zone,
+            multiplier=surge_engine.multiplier(latitude, longitude),
+            demand=demand,
+            supply=supply
+        )]
+    return [
+        SurgeZoneResponse(zone=zone, multiplier=multiplier, demand=demand, supply=supply)
+        for zone, multiplier, demand, supply in surge_engine.zones()
+    ]
@@ -1,16 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import exists, select, update
+from sqlalchemy.orm import selectinload
+from typing import List, Optional, Set
 from datetime import datetime
 
 from app.database import get_db
-from app.models import Ride, User
-from app.schemas import RideCreate, RideResponse, RideUpdate
+from app.models import Car, Driver, Payment, Ride, User
+from app.schemas import (
+    CarResponse,
+    DriverResponse,
+    PaymentResponse,
+    RideCreate,
+    RideExpandedResponse,
+    RideResponse,
+    RideUpdate
+)
 from app.auth import get_current_user
+from app.locations import location_index
+from app.jobs import DriverAssigned
+from app.tasks import task_queue
+from app.params import parse_expand
+from app.surge import surge_engine
+from app.dispatch import pending_ride_waiters
+from app.etag import is_not_modified, make_etag, not_modified, set_etag, version_columns
 
 router = APIRouter()
 
+# Водитель занят поездкой, пока она в одном из этих статусов
+ACTIVE_RIDE_STATUSES = ("pending", "in_progress")
+FINISHED_RIDE_STATUSES = ("completed", "cancelled")
+
+
+def ride_load_options(expand: Set[str]) -> list:
+    """
+    selectinload для связанных записей: один дополнительный запрос на связь,
+    независимо от количества поездок
+    """
+    options = []
+    if "car" in expand:
+        options.append(selectinload(Ride.driver).selectinload(Driver.cars))
+    elif "driver" in expand:
+        options.append(selectinload(Ride.driver))
+    if "payment" in expand:
+        options.append(selectinload(Ride.payment))
+    return options
+
+
+def ride_version_columns(condition, expansions: Set[str]) -> list:
+    """
+    Версии поездок и встроенных через expand записей для ETag
+    """
+    ride_ids = select(Ride.id).where(condition)
+    ride_driver_ids = select(Ride.driver_id).where(condition)
+    columns = version_columns(Ride, condition)
+    if "driver" in expansions or "car" in expansions:
+        columns += version_columns(Driver, Driver.id.in_(ride_driver_ids))
+    if "car" in expansions:
+        columns += version_columns(Car, Car.driver_id.in_(ride_driver_ids))
+    if "payment" in expansions:
+        columns += version_columns(Payment, Payment.ride_id.in_(ride_ids))
+    return columns
+
+
+async def release_driver(db: AsyncSession, driver_id: int, ride_id: int):
+    """
+    Водитель снова доступен для claim-next (в той же транзакции, что и смена статуса поездки),
+    если у него нет другой незавершенной поездки
+    """
+    other_active_ride = exists().where(
+        Ride.driver_id == driver_id,
+        Ride.id != ride_id,
+        Ride.status == "in_progress"
+    )
+    await db.execute(
+        update(Driver)
+        .where(Driver.id == driver_id, ~other_active_ride)
+        .values(is_available=True)
+    )
+
+
+def serialize_ride(ride: Ride, expand: Set[str]) -> RideExpandedResponse:
+    """
+    Поездка со встроенными связанными записями (только загруженными через expand)
+    """
+    data = RideResponse.model_validate(ride).model_dump()
+    if "driver" in expand:
+        data["driver"] = DriverResponse.model_validate(ride.driver) if ride.driver else None
+    if "car" in expand:
+        cars = ride.driver.cars if ride.driver else []
+        data["cars"] = [CarResponse.model_validate(car) for car in cars]
+    if "payment" in expand:
+        data["payment"] = PaymentResponse.model_validate(ride.payment) if ride.payment else None
+    return RideExpandedResponse(**data)
+
 
 @router.post("/", response_model=RideResponse, status_code=status.HTTP_201_CREATED)
 async def create_ride(
@@ -25,59 +108,108 @@ async def create_ride(
         user_id=current_user.id,
         pickup_location=ride.pickup_location,
         dropoff_location=ride.dropoff_location,
+        pickup_latitude=ride.pickup_latitude,
+        pickup_longitude=ride.pickup_longitude,
         status="pending"
     )
     db.add(db_ride)
     await db.commit()
     await db.refresh(db_ride)
+
+    location_index.add(db_ride.pickup_location, user_id=current_user.id)
+    location_index.add(db_ride.dropoff_location, user_id=current_user.id)
+    surge_engine.record_demand(db_ride.pickup_latitude, db_ride.pickup_longitude)
+    pending_ride_waiters.notify()
     return db_ride
 
 
-@router.get("/", response_model=List[RideResponse])
+@router.get(
+    "/",
+    response_model=List[RideExpandedResponse],
+    response_model_exclude_unset=True
+)
 async def get_rides(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
+    expand: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получить список поездок текущего пользователя
+    (expand=driver,car,payment встраивает связанные записи)
     """
+    expansions = parse_expand(expand)
+    result = await db.execute(
+        select(*ride_version_columns(Ride.user_id == current_user.id, expansions))
+    )
+    etag = make_etag("rides", current_user.id, skip, limit, sorted(expansions), *result.one())
+    if is_not_modified(request, etag, "rides"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     result = await db.execute(
         select(Ride)
+        .options(*ride_load_options(expansions))
         .where(Ride.user_id == current_user.id)
         .offset(skip)
         .limit(limit)
     )
     rides = result.scalars().all()
-    return rides
+    return [serialize_ride(ride, expansions) for ride in rides]
 
 
-@router.get("/{ride_id}", response_model=RideResponse)
+@router.get(
+    "/{ride_id}",
+    response_model=RideExpandedResponse,
+    response_model_exclude_unset=True
+)
 async def get_ride(
     ride_id: int,
+    request: Request,
+    response: Response,
+    expand: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получить детали конкретной поездки
+    (expand=driver,car,payment встраивает связанные записи)
     """
-    result = await db.execute(select(Ride).where(Ride.id == ride_id))
-    ride = result.scalar_one_or_none()
+    expansions = parse_expand(expand)
+    # Владелец и версии одним легким запросом, до загрузки самой поездки
+    result = await db.execute(select(
+        select(Ride.user_id).where(Ride.id == ride_id).scalar_subquery(),
+        *ride_version_columns(Ride.id == ride_id, expansions)
+    ))
+    owner_id, *versions = result.one()
     
-    if not ride:
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ride not found"
         )
     
-    if ride.user_id != current_user.id:
+    if owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this ride"
         )
     
-    return ride
+    etag = make_etag("ride", ride_id, sorted(expansions), *versions)
+    if is_not_modified(request, etag, "ride"):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    result = await db.execute(
+        select(Ride)
+        .options(*ride_load_options(expansions))
+        .where(Ride.id == ride_id)
+    )
+    ride = result.scalar_one()
+    return serialize_ride(ride, expansions)
 
 
 @router.patch("/{ride_id}", response_model=RideResponse)
@@ -90,7 +222,9 @@ async def update_ride(
     """
     Обновить информацию о поездке (статус, водитель, цена)
     """
-    result = await db.execute(select(Ride).where(Ride.id == ride_id))
+    # Блокировка строки: claim-next (SKIP LOCKED) пропустит поездку, а статус
+    # и водитель ниже читаются уже после завершения чужого захвата
+    result = await db.execute(select(Ride).where(Ride.id == ride_id).with_for_update())
     ride = result.scalar_one_or_none()
     
     if not ride:
@@ -105,17 +239,38 @@ async def update_ride(
             detail="Not authorized to update this ride"
         )
     
+    driver_assigned = (
+        ride_update.driver_id is not None and ride_update.driver_id != ride.driver_id
+    )
+    # Освобождаем только водителя, который был на этой поездке до изменения
+    assigned_driver_id = ride.driver_id
+    finishing = (
+        ride.status in ACTIVE_RIDE_STATUSES
+        and ride_update.status in FINISHED_RIDE_STATUSES
+    )
     if ride_update.driver_id is not None:
         ride.driver_id = ride_update.driver_id
     if ride_update.status is not None:
         ride.status = ride_update.status
         if ride_update.status == "completed":
             ride.completed_at = datetime.utcnow()
+    if finishing and assigned_driver_id is not None:
+        await release_driver(db, assigned_driver_id, ride.id)
     if ride_update.price is not None:
-        ride.price = ride_update.price
+        # Базовая цена умножается на текущий surge-множитель зоны подачи
+        multiplier = surge_engine.multiplier(ride.pickup_latitude, ride.pickup_longitude)
+        ride.surge_multiplier = multiplier
+        ride.price = round(ride_update.price * multiplier, 2)
     
     await db.commit()
     await db.refresh(ride)
+
+    if driver_assigned:
+        await task_queue.enqueue("driver_assigned", DriverAssigned(
+            ride_id=ride.id,
+            driver_id=ride.driver_id,
+            user_id=ride.user_id
+        ))
     return ride
 
 
@@ -128,7 +283,8 @@ async def cancel_ride(
     """
     Отменить поездку
     """
-    result = await db.execute(select(Ride).where(Ride.id == ride_id))
+    # Как в update_ride: без блокировки отмена перезаписала бы одновременный захват
+    result = await db.execute(select(Ride).where(Ride.id == ride_id).with_for_update())
     ride = result.scalar_one_or_none()
     
     if not ride:
@@ -143,6 +299,14 @@ async def cancel_ride(
             detail="Not authorized to cancel this ride"
         )
     
+    if ride.status in FINISHED_RIDE_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ride is already {ride.status}"
+        )
+    
     ride.status = "cancelled"
+    if ride.driver_id is not None:
+        await release_driver(db, ride.driver_id, ride.id)
     await db.commit()
     return None
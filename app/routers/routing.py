@@ -0,0 +1,116 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import asyncio
+import os
+import time
+
+from app.models import User
+from app.schemas import (
+    RouteBatchRequest,
+    RouteEstimate,
+    RouteMatrixRequest,
+    RouteMatrixResponse
+)
+from app.auth import get_current_user
+from app.metrics import metrics
+from app.routing import routing_engine
+
+router = APIRouter()
+
+# Поиск путей - чистый Python и держит GIL; одновременно считаем не больше
+# стольких пакетов/матриц, остальные ждут, а не отнимают время у event loop
+ROUTING_MAX_CONCURRENCY = int(os.getenv("ROUTING_MAX_CONCURRENCY", "2"))
+_heavy_slots = asyncio.Semaphore(ROUTING_MAX_CONCURRENCY)
+# Отдельный лимит для одиночных ETA: короткие запросы не ждут матрицы
+ROUTING_ETA_CONCURRENCY = int(os.getenv("ROUTING_ETA_CONCURRENCY", "4"))
+_eta_slots = asyncio.Semaphore(ROUTING_ETA_CONCURRENCY)
+
+
+def _require_graph():
+    if not routing_engine.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Road graph is not loaded"
+        )
+
+
+@router.get("/eta", response_model=RouteEstimate)
+async def get_eta(
+    from_latitude: float = Query(..., ge=-90, le=90),
+    from_longitude: float = Query(..., ge=-180, le=180),
+    to_latitude: float = Query(..., ge=-90, le=90),
+    to_longitude: float = Query(..., ge=-180, le=180),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Время в пути и расстояние по дорогам между двумя точками
+    """
+    _require_graph()
+    started = time.perf_counter()
+    # Поиск пути занимает CPU - выполняем вне event loop
+    async with _eta_slots:
+        route = await run_in_threadpool(
+            routing_engine.route, from_latitude, from_longitude, to_latitude, to_longitude
+        )
+    metrics.observe("routing.eta", time.perf_counter() - started)
+    if route is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Route not found"
+        )
+    duration, distance = route
+    return RouteEstimate(duration_s=round(duration, 1), distance_m=round(distance, 1))
+
+
+@router.post("/eta/batch", response_model=List[Optional[RouteEstimate]])
+async def get_eta_batch(
+    batch: RouteBatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Пакетный расчет ETA; для пар без маршрута возвращается null
+    """
+    _require_graph()
+
+    def compute():
+        return [
+            routing_engine.route(
+                pair.origin.latitude, pair.origin.longitude,
+                pair.destination.latitude, pair.destination.longitude
+            )
+            for pair in batch.pairs
+        ]
+
+    started = time.perf_counter()
+    async with _heavy_slots:
+        routes = await run_in_threadpool(compute)
+    metrics.observe("routing.eta_batch", time.perf_counter() - started)
+    return [
+        RouteEstimate(duration_s=round(route[0], 1), distance_m=round(route[1], 1)) if route else None
+        for route in routes
+    ]
+
+
+@router.post("/matrix", response_model=RouteMatrixResponse)
+async def get_matrix(
+    request: RouteMatrixRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Матрица времени и расстояний источники x цели (например, водители x заказы)
+    """
+    _require_graph()
+    started = time.perf_counter()
+    async with _heavy_slots:
+        matrix = await run_in_threadpool(
+            routing_engine.matrix,
+            [(point.latitude, point.longitude) for point in request.sources],
+            [(point.latitude, point.longitude) for point in request.targets],
+            request.max_duration_s
+        )
+    metrics.observe("routing.matrix", time.perf_counter() - started)
+    return RouteMatrixResponse(
+        durations_s=[[round(cell[0], 1) if cell else None for cell in row] for row in matrix],
+        distances_m=[[round(cell[1], 1) if cell else None for cell in row] for row in matrix]
+    )
@@ -0,0 +1,341 @@
+from array import array
+from functools import lru_cache
+from heapq import heappop, heappush
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH")
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", "100000"))
+# Размер ячейки сетки для поиска ближайшей вершины, в градусах
+ROUTING_GRID_SIZE_DEG = float(os.getenv("ROUTING_GRID_SIZE_DEG", "0.005"))
+
+# Формат файла (little-endian), каждый массив выровнен на 8 байт:
+#   заголовок: magic, число вершин, число ребер, максимальная скорость (м/с)
+#   latitudes: float64[n], longitudes: float64[n]
+#   прямой граф CSR: offsets uint32[n+1], targets uint32[m], durations float32[m] (с), lengths float32[m] (м)
+#   обратный граф CSR в том же формате
+GRAPH_MAGIC = b"RGRAPH01"
+HEADER = struct.Struct("<8sIId")
+HEADER_SIZE = 32
+
+EARTH_RADIUS_M = 6371008.8
+
+Edge = Tuple[int, int, float, float]  # source, target, length_m, duration_s
+Csr = Tuple[Sequence[int], Sequence[int], Sequence[float], Sequence[float]]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _build_csr(n: int, edges: List[Edge], reverse: bool) -> Tuple[array, array, array, array]:
+    offsets = array("I", [0]) * (n + 1)
+    for source, target, _, _ in edges:
+        offsets[(target if reverse else source) + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+
+    m = len(edges)
+    targets = array("I", [0]) * m
+    durations = array("f", [0.0]) * m
+    lengths = array("f", [0.0]) * m
+    position = offsets[:-1]
+    for source, target, length, duration in edges:
+        u, v = (target, source) if reverse else (source, target)
+        i = position[u]
+        position[u] += 1
+        targets[i] = v
+        durations[i] = duration
+        lengths[i] = length
+    return offsets, targets, durations, lengths
+
+
+def write_road_graph(
+    path: str,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    edges: Iterable[Edge],
+):
+    """
+    Предобработка: запись графа в компактный CSR-файл для RoadGraph
+    """
+    n = len(latitudes)
+    edges = list(edges)
+    max_speed = 0.0
+    for source, target, length, duration in edges:
+        # Эвристика A* опирается на расстояние по прямой, поэтому скорость
+        # считаем не меньше, чем по прямой между концами ребра
+        straight = haversine_m(latitudes[source], longitudes[source], latitudes[target], longitudes[target])
+        if duration > 0:
+            max_speed = max(max_speed, max(length, straight) / duration)
+
+    arrays = [array("d", latitudes), array("d", longitudes)]
+    arrays += _build_csr(n, edges, reverse=False)
+    arrays += _build_csr(n, edges, reverse=True)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(GRAPH_MAGIC, n, len(edges), max_speed or 1.0).ljust(HEADER_SIZE, b"\0"))
+        offset = HEADER_SIZE
+        for values in arrays:
+            data = values.tobytes()
+            f.write(data)
+            offset += len(data)
+            padding = _aligned(offset) - offset
+            f.write(b"\0" * padding)
+            offset += padding
+
+
+class RoadGraph:
+    """
+    Граф дорог, отображенный в память (mmap): массивы читаются прямо из файла
+    без копирования, несколько процессов делят одни и те же страницы
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("Road graph files are little-endian")
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.node_count, self.edge_count, self.max_speed = HEADER.unpack_from(self._mmap, 0)
+        if magic != GRAPH_MAGIC:
+            raise ValueError(f"{path} is not a road graph file")
+
+        view = memoryview(self._mmap)
+        offset = HEADER_SIZE
+
+        def take(fmt: str, count: int) -> memoryview:
+            nonlocal offset
+            size = struct.calcsize(fmt) * count
+            values = view[offset:offset + size].cast(fmt)
+            offset = _aligned(offset + size)
+            return values
+
+        n, m = self.node_count, self.edge_count
+        self.latitudes = take("d", n)
+        self.longitudes = take("d", n)
+        self.forward: Csr = (take("I", n + 1), take("I", m), take("f", m), take("f", m))
+        self.backward: Csr = (take("I", n + 1), take("I", m), take("f", m), take("f", m))
+        self._grid = self._build_grid()
+
+    def _build_grid(self) -> Dict[Tuple[int, int], List[int]]:
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        max_abs_latitude = 0.0
+        for node in range(self.node_count):
+            latitude = self.latitudes[node]
+            max_abs_latitude = max(max_abs_latitude, abs(latitude))
+            cell = self._cell(latitude, self.longitudes[node])
+            grid.setdefault(cell, []).append(node)
+
+        # Метров на градус для плоской эвристики A*: по долготе берем самую
+        # узкую широту графа и небольшой запас, чтобы оценка оставалась снизу
+        meters_per_degree = math.pi / 180 * EARTH_RADIUS_M * 0.99
+        self.meters_per_degree_lat = meters_per_degree
+        self.meters_per_degree_lon = meters_per_degree * math.cos(math.radians(max_abs_latitude))
+        return grid
+
+    @staticmethod
+    def _cell(latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            math.floor(latitude / ROUTING_GRID_SIZE_DEG),
+            math.floor(longitude / ROUTING_GRID_SIZE_DEG),
+        )
+
+    def nearest_node(self, latitude: float, longitude: float, max_rings: int = 20) -> Optional[int]:
+        """
+        Ближайшая вершина: обход колец ячеек сетки вокруг точки
+        """
+        cx, cy = self._cell(latitude, longitude)
+        # Нижняя оценка ширины ячейки в метрах (по долготе ячейка уже)
+        cell_width_m = ROUTING_GRID_SIZE_DEG * math.pi / 180 * EARTH_RADIUS_M * math.cos(math.radians(latitude))
+        best, best_distance = None, math.inf
+        for ring in range(max_rings + 1):
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue
+                    for node in self._grid.get((x, y), ()):
+                        distance = haversine_m(latitude, longitude, self.latitudes[node], self.longitudes[node])
+                        if distance < best_distance:
+                            best, best_distance = node, distance
+            # Вершины следующего кольца не ближе ring ячеек от точки
+            if best is not None and best_distance <= ring * cell_width_m:
+                break
+        return best
+
+
+class RoutingEngine:
+    """
+    ETA и расстояние по графу дорог: двунаправленный A* для пар точек,
+    one-to-many Дейкстра для матриц (диспетчеризация), LRU-кеш пар вершин
+    """
+
+    def __init__(self):
+        self.graph: Optional[RoadGraph] = None
+        self._route_cached = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.graph is not None
+
+    def load(self, path: str):
+        graph = RoadGraph(path)
+        self._route_cached = lru_cache(maxsize=ROUTING_CACHE_SIZE)(self._route_nodes)
+        self.graph = graph
+        metrics.gauge("routing.cache_hits", lambda: self._route_cached.cache_info().hits)
+        metrics.gauge("routing.cache_misses", lambda: self._route_cached.cache_info().misses)
+        logger.info(f"Road graph loaded: {graph.node_count} nodes, {graph.edge_count} edges")
+
+    def route(
+        self, from_latitude: float, from_longitude: float, to_latitude: float, to_longitude: float
+    ) -> Optional[Tuple[float, float]]:
+        """
+        (длительность в секундах, расстояние в метрах) или None, если маршрута нет
+        """
+        source = self.graph.nearest_node(from_latitude, from_longitude)
+        target = self.graph.nearest_node(to_latitude, to_longitude)
+        if source is None or target is None:
+            return None
+        return self._route_cached(source, target)
+
+    def matrix(
+        self,
+        sources: List[Tuple[float, float]],
+        targets: List[Tuple[float, float]],
+        max_duration: float = math.inf,
+    ) -> List[List[Optional[Tuple[float, float]]]]:
+        """
+        Матрица источники x цели; поиск идет со стороны, где точек меньше.
+        Поиск не идет дальше max_duration секунд (для диспетчеризации важны ближайшие)
+        """
+        source_nodes = [self.graph.nearest_node(lat, lon) for lat, lon in sources]
+        target_nodes = [self.graph.nearest_node(lat, lon) for lat, lon in targets]
+        result: List[List[Optional[Tuple[float, float]]]] = [[None] * len(targets) for _ in sources]
+
+        if len(source_nodes) <= len(target_nodes):
+            wanted = {node for node in target_nodes if node is not None}
+            for i, source in enumerate(source_nodes):
+                if source is None:
+                    continue
+                reached = self._one_to_many(source, wanted, self.graph.forward, max_duration)
+                for j, target in enumerate(target_nodes):
+                    result[i][j] = reached.get(target)
+        else:
+            wanted = {node for node in source_nodes if node is not None}
+            for j, target in enumerate(target_nodes):
+                if target is None:
+                    continue
+                reached = self._one_to_many(target, wanted, self.graph.backward, max_duration)
+                for i, source in enumerate(source_nodes):
+                    result[i][j] = reached.get(source)
+        return result
+
+    def _one_to_many(
+        self, origin: int, wanted: Set[int], csr: Csr, max_duration: float = math.inf
+    ) -> Dict[int, Tuple[float, float]]:
+        offsets, heads, durations, lengths = csr
+        dist = {origin: 0.0}
+        length = {origin: 0.0}
+        settled: Dict[int, Tuple[float, float]] = {}
+        remaining = len(wanted)
+        heap = [(0.0, origin)]
+        while heap and remaining:
+            du, u = heappop(heap)
+            if du > max_duration:
+                break
+            if u in settled:
+                continue
+            settled[u] = (du, length[u])
+            if u in wanted:
+                remaining -= 1
+            lu = length[u]
+            for i in range(offsets[u], offsets[u + 1]):
+                v = heads[i]
+                dv = du + durations[i]
+                if dv < dist.get(v, math.inf):
+                    dist[v] = dv
+                    length[v] = lu + lengths[i]
+                    heappush(heap, (dv, v))
+        return {node: settled[node] for node in wanted if node in settled}
+
+    def _route_nodes(self, source: int, target: int) -> Optional[Tuple[float, float]]:
+        """
+        Двунаправленный A* с усредненными потенциалами (pf = (h_t - h_s) / 2, pr = -pf):
+        останов, когда сумма минимальных ключей двух очередей не меньше лучшего пути
+        """
+        if source == target:
+            return (0.0, 0.0)
+        graph = self.graph
+        lat, lon = graph.latitudes, graph.longitudes
+        ky, kx = graph.meters_per_degree_lat, graph.meters_per_degree_lon
+        half_pace = 1 / (2 * graph.max_speed)
+        sx, sy = lon[source] * kx, lat[source] * ky
+        tx, ty = lon[target] * kx, lat[target] * ky
+        hypot = math.hypot
+        potentials: Dict[int, float] = {}
+
+        def potential(v: int) -> float:
+            # Плоская проекция вместо haversine: в несколько раз дешевле и остается нижней оценкой
+            p = potentials.get(v)
+            if p is None:
+                vx, vy = lon[v] * kx, lat[v] * ky
+                p = (hypot(vx - tx, vy - ty) - hypot(vx - sx, vy - sy)) * half_pace
+                potentials[v] = p
+            return p
+
+        csr = (graph.forward, graph.backward)
+        dist = ({source: 0.0}, {target: 0.0})
+        length = ({source: 0.0}, {target: 0.0})
+        settled = (set(), set())
+        heaps = ([(potential(source), source)], [(-potential(target), target)])
+        best, best_length = math.inf, 0.0
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+
+            offsets, heads, durations, lengths = csr[side]
+            own_dist, own_length = dist[side], length[side]
+            other_dist, other_length = dist[1 - side], length[1 - side]
+            sign = 1.0 if side == 0 else -1.0
+            du, lu = own_dist[u], own_length[u]
+            for i in range(offsets[u], offsets[u + 1]):
+                v = heads[i]
+                dv = du + durations[i]
+                if dv < own_dist.get(v, math.inf):
+                    own_dist[v] = dv
+                    own_length[v] = lu + lengths[i]
+                    heappush(heaps[side], (dv + sign * potential(v), v))
+                    other = other_dist.get(v)
+                    if other is not None and dv + other < best:
+                        best = dv + other
+                        best_length = own_length[v] + other_length[v]
+
+        if best == math.inf:
+            return None
+        return (best, best_length)
+
+
+routing_engine = RoutingEngine()
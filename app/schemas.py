@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 # User Schemas
@@ -27,6 +27,8 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    # Есть в токенах, выданных после добавления claim uid
+    user_id: Optional[int] = None
 
 
 # Driver Schemas
@@ -49,6 +51,34 @@ class DriverResponse(BaseModel):
         from_attributes = True
 
 
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    heading: Optional[float] = None
+    speed: Optional[float] = None
+    recorded_at: Optional[datetime] = None
+
+
+class LocationPingBatch(BaseModel):
+    pings: List[LocationPing] = Field(..., min_length=1, max_length=500)
+
+
+class LocationAccepted(BaseModel):
+    accepted: int
+
+
+class DriverLocationResponse(BaseModel):
+    driver_id: int
+    latitude: float
+    longitude: float
+    heading: Optional[float]
+    speed: Optional[float]
+    recorded_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # Car Schemas
 class CarCreate(BaseModel):
     driver_id: int
@@ -75,6 +105,8 @@ class CarResponse(BaseModel):
 class RideCreate(BaseModel):
     pickup_location: str
     dropoff_location: str
+    pickup_latitude: Optional[float] = Field(None, ge=-90, le=90)
+    pickup_longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class RideUpdate(BaseModel):
@@ -89,8 +121,11 @@ class RideResponse(BaseModel):
     driver_id: Optional[int]
     pickup_location: str
     dropoff_location: str
+    pickup_latitude: Optional[float] = None
+    pickup_longitude: Optional[float] = None
     status: str
     price: Optional[float]
+    surge_multiplier: Optional[float] = None
     created_at: datetime
     completed_at: Optional[datetime]
 
@@ -116,3 +151,58 @@ class PaymentResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class RideExpandedResponse(RideResponse):
+    # Заполняются только при запросе через expand=driver,car,payment
+    driver: Optional[DriverResponse] = None
+    cars: Optional[List[CarResponse]] = None
+    payment: Optional[PaymentResponse] = None
+
+
+# Pricing Schemas
+class SurgeZoneResponse(BaseModel):
+    zone: str
+    multiplier: float
+    demand: int
+    supply: int
+
+
+# Routing Schemas
+class Point(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+class RoutePair(BaseModel):
+    origin: Point
+    destination: Point
+
+
+class RouteEstimate(BaseModel):
+    duration_s: float
+    distance_m: float
+
+
+class RouteBatchRequest(BaseModel):
+    pairs: List[RoutePair] = Field(..., min_length=1, max_length=100)
+
+
+class RouteMatrixRequest(BaseModel):
+    sources: List[Point] = Field(..., min_length=1, max_length=25)
+    targets: List[Point] = Field(..., min_length=1, max_length=25)
+    # Пары дальше этого времени в пути возвращаются как null; ограничивает
+    # поиск, поэтому обязателен (не больше 15 минут)
+    max_duration_s: float = Field(..., gt=0, le=900)
+
+
+class RouteMatrixResponse(BaseModel):
+    # None - маршрут не найден
+    durations_s: List[List[Optional[float]]]
+    distances_m: List[List[Optional[float]]]
+
+
+# Location Schemas
+class LocationSuggestion(BaseModel):
+    location: str
+    count: int
@@ -0,0 +1,270 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+
+from sqlalchemy import select, delete, insert
+
+from app.database import async_session_maker
+from app.metrics import metrics
+from app.models import Driver, SurgeCounter
+
+logger = logging.getLogger(__name__)
+
+SURGE_ZONE_SIZE_DEG = float(os.getenv("SURGE_ZONE_SIZE_DEG", "0.01"))  # ~1 км
+SURGE_WINDOW_SECONDS = int(os.getenv("SURGE_WINDOW_SECONDS", "300"))
+SURGE_BUCKET_SECONDS = int(os.getenv("SURGE_BUCKET_SECONDS", "10"))
+SURGE_TICK_SECONDS = float(os.getenv("SURGE_TICK_SECONDS", "5"))
+SURGE_MAX_MULTIPLIER = float(os.getenv("SURGE_MAX_MULTIPLIER", "3.0"))
+# Насколько сильно множитель растет с отношением спроса к предложению
+SURGE_SENSITIVITY = float(os.getenv("SURGE_SENSITIVITY", "0.5"))
+# Коэффициент экспоненциального сглаживания на каждом тике
+SURGE_SMOOTHING = float(os.getenv("SURGE_SMOOTHING", "0.3"))
+# Ближе этого к целевому значению множитель приравнивается к цели
+SURGE_SNAP_EPSILON = 0.005
+# Меньше заказов в окне - не повышаем цену
+SURGE_MIN_DEMAND = int(os.getenv("SURGE_MIN_DEMAND", "3"))
+SURGE_STORE = os.getenv("SURGE_STORE", "memory")  # memory, database
+
+# Зона для поездок без координат и для города целиком
+CITY_ZONE = "city"
+
+ZoneCounts = Dict[str, Tuple[int, Set[int]]]
+
+
+def zone_for(latitude: Optional[float], longitude: Optional[float]) -> str:
+    """
+    Зона - ячейка сетки SURGE_ZONE_SIZE_DEG x SURGE_ZONE_SIZE_DEG
+    """
+    if latitude is None or longitude is None:
+        return CITY_ZONE
+    return f"{math.floor(latitude / SURGE_ZONE_SIZE_DEG)}:{math.floor(longitude / SURGE_ZONE_SIZE_DEG)}"
+
+
+class SlidingWindow:
+    """
+    Кольцо корзин за последние SURGE_WINDOW_SECONDS: счетчик заказов и
+    множество доступных водителей в каждой корзине
+    """
+
+    def __init__(self):
+        size = max(1, SURGE_WINDOW_SECONDS // SURGE_BUCKET_SECONDS)
+        self._epochs: List[int] = [-1] * size
+        self._demand: List[int] = [0] * size
+        self._supply: List[Set[int]] = [set() for _ in range(size)]
+
+    def _slot(self, now: float) -> int:
+        epoch = int(now // SURGE_BUCKET_SECONDS)
+        slot = epoch % len(self._epochs)
+        if self._epochs[slot] != epoch:
+            # Корзина устарела - переиспользуем
+            self._epochs[slot] = epoch
+            self._demand[slot] = 0
+            self._supply[slot] = set()
+        return slot
+
+    def add_demand(self, now: float):
+        self._demand[self._slot(now)] += 1
+
+    def add_supply(self, now: float, driver_id: int):
+        self._supply[self._slot(now)].add(driver_id)
+
+    def totals(self, now: float) -> Tuple[int, Set[int]]:
+        oldest = int(now // SURGE_BUCKET_SECONDS) - len(self._epochs) + 1
+        demand = 0
+        supply: Set[int] = set()
+        for slot, epoch in enumerate(self._epochs):
+            if epoch >= oldest:
+                demand += self._demand[slot]
+                supply |= self._supply[slot]
+        return demand, supply
+
+
+class SurgeStore:
+    """
+    Общее хранилище счетчиков для нескольких экземпляров сервиса.
+    Базовая реализация - один экземпляр, счетчики только локальные.
+    """
+
+    async def exchange(self, instance_id: str, local: ZoneCounts) -> ZoneCounts:
+        return local
+
+
+class DatabaseSurgeStore(SurgeStore):
+    """
+    Экземпляры публикуют свои окна в surge_counters и читают сумму по всем живым экземплярам
+    """
+
+    async def exchange(self, instance_id: str, local: ZoneCounts) -> ZoneCounts:
+        now = datetime.utcnow()
+        async with async_session_maker() as session:
+            await session.execute(delete(SurgeCounter).where(SurgeCounter.instance_id == instance_id))
+            if local:
+                await session.execute(insert(SurgeCounter), [
+                    {
+                        "instance_id": instance_id,
+                        "zone": zone,
+                        "demand": demand,
+                        "supply_driver_ids": json.dumps(sorted(supply)),
+                        "updated_at": now,
+                    }
+                    for zone, (demand, supply) in local.items()
+                ])
+            # Экземпляры, пропустившие несколько тиков, считаются остановленными
+            stale = now - timedelta(seconds=SURGE_TICK_SECONDS * 3)
+            await session.execute(delete(SurgeCounter).where(SurgeCounter.updated_at < stale))
+            result = await session.execute(
+                select(SurgeCounter.zone, SurgeCounter.demand, SurgeCounter.supply_driver_ids)
+            )
+            rows = result.all()
+            await session.commit()
+
+        merged: ZoneCounts = {}
+        for zone, demand, supply_ids in rows:
+            total_demand, total_supply = merged.get(zone, (0, set()))
+            # Водитель мог попасть на разные экземпляры - объединяем множества
+            merged[zone] = (total_demand + demand, total_supply | set(json.loads(supply_ids)))
+        return merged
+
+
+class SurgeEngine:
+    """
+    Множитель цены по зонам из соотношения спроса (новые заказы) и
+    предложения (доступные водители) в скользящем окне.
+
+    Множители пересчитываются фоновым тиком и сглаживаются, поэтому
+    расчет цены - чтение из словаря без запросов к БД.
+    """
+
+    def __init__(self, store: SurgeStore):
+        self.store = store
+        self.instance_id = uuid.uuid4().hex
+        self._windows: Dict[str, SlidingWindow] = {}
+        self._multipliers: Dict[str, float] = {}
+        self._counts: ZoneCounts = {}
+        self._available_drivers: Set[int] = set()
+        self._ticker: Optional[asyncio.Task] = None
+        metrics.gauge("surge.zones", lambda: len(self._multipliers))
+
+    def _window(self, zone: str) -> SlidingWindow:
+        window = self._windows.get(zone)
+        if window is None:
+            window = self._windows[zone] = SlidingWindow()
+        return window
+
+    def record_demand(self, latitude: Optional[float], longitude: Optional[float]):
+        now = time.time()
+        zone = zone_for(latitude, longitude)
+        self._window(zone).add_demand(now)
+        if zone != CITY_ZONE:
+            self._window(CITY_ZONE).add_demand(now)
+
+    def record_supply(self, driver_id: int, latitude: float, longitude: float):
+        """
+        Водитель на линии в зоне (по GPS-точке); учитываются только доступные водители
+        """
+        if driver_id not in self._available_drivers:
+            return
+        self._window(zone_for(latitude, longitude)).add_supply(time.time(), driver_id)
+
+    def multiplier(self, latitude: Optional[float] = None, longitude: Optional[float] = None) -> float:
+        zone = zone_for(latitude, longitude)
+        multiplier = self._multipliers.get(zone)
+        if multiplier is None:
+            multiplier = self._multipliers.get(CITY_ZONE, 1.0)
+        # Хранится точное значение (иначе сглаживание не сходится), наружу - до сотых
+        return round(multiplier, 2)
+
+    def zones(self) -> List[Tuple[str, float, int, int]]:
+        return [
+            (zone, round(multiplier, 2), *self.zone_counts(zone))
+            for zone, multiplier in sorted(self._multipliers.items())
+        ]
+
+    def zone_counts(self, zone: str) -> Tuple[int, int]:
+        demand, supply = self._counts.get(zone, (0, set()))
+        return demand, len(supply)
+
+    async def _refresh_available(self):
+        async with async_session_maker() as session:
+            result = await session.execute(select(Driver.id).where(Driver.is_available == True))
+            self._available_drivers = set(result.scalars().all())
+
+    async def tick(self):
+        started = time.perf_counter()
+        now = time.time()
+        await self._refresh_available()
+
+        local: ZoneCounts = {}
+        for zone, window in list(self._windows.items()):
+            demand, supply = window.totals(now)
+            if not demand and not supply:
+                del self._windows[zone]
+                continue
+            local[zone] = (demand, supply)
+
+        counts = await self.store.exchange(self.instance_id, local)
+        # Для города целиком предложение - все доступные водители, даже без GPS
+        city_demand, _ = counts.get(CITY_ZONE, (0, set()))
+        counts[CITY_ZONE] = (city_demand, set(self._available_drivers))
+        # Без GPS-потока в окне предложение по ячейкам неизвестно - ячейки берут множитель города
+        has_gps_supply = any(supply for zone, (_, supply) in counts.items() if zone != CITY_ZONE)
+
+        multipliers: Dict[str, float] = {}
+        for zone, (demand, supply) in counts.items():
+            if zone != CITY_ZONE and not has_gps_supply:
+                continue
+            if demand < SURGE_MIN_DEMAND:
+                target = 1.0
+            else:
+                ratio = demand / max(len(supply), 1)
+                target = min(SURGE_MAX_MULTIPLIER, max(1.0, 1.0 + SURGE_SENSITIVITY * (ratio - 1.0)))
+            previous = self._multipliers.get(zone, 1.0)
+            smoothed = previous + SURGE_SMOOTHING * (target - previous)
+            if abs(target - smoothed) < SURGE_SNAP_EPSILON:
+                smoothed = target
+            multipliers[zone] = smoothed
+
+        # Зоны, вернувшиеся к базовой цене и без активности, не храним
+        self._multipliers = {
+            zone: multiplier for zone, multiplier in multipliers.items()
+            if multiplier > 1.0 or zone == CITY_ZONE or zone in local
+        }
+        self._counts = counts
+        metrics.observe("surge.tick", time.perf_counter() - started)
+
+    async def _tick_loop(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Surge tick failed: {e}")
+            await asyncio.sleep(SURGE_TICK_SECONDS)
+
+    def start(self):
+        self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def stop(self):
+        if self._ticker:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+
+
+def create_store() -> SurgeStore:
+    if SURGE_STORE == "database":
+        return DatabaseSurgeStore()
+    return SurgeStore()
+
+
+surge_engine = SurgeEngine(create_store())
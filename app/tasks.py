@@ -0,0 +1,354 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Type
+import asyncio
+import logging
+import os
+import random
+import time
+
+from pydantic import BaseModel
+from sqlalchemy import select, delete, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.metrics import metrics
+from app.models import TaskOutbox
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "1000"))
+TASK_OUTBOX_ENABLED = os.getenv("TASK_OUTBOX_ENABLED", "false").lower() == "true"
+# Сколько секунд экземпляр держит задачу из outbox, прежде чем ее заберет другой
+TASK_OUTBOX_LEASE_SECONDS = int(os.getenv("TASK_OUTBOX_LEASE_SECONDS", "300"))
+TASK_OUTBOX_POLL_SECONDS = float(os.getenv("TASK_OUTBOX_POLL_SECONDS", "5"))
+TASK_DRAIN_TIMEOUT_SECONDS = float(os.getenv("TASK_DRAIN_TIMEOUT_SECONDS", "10"))
+
+Handler = Callable[[BaseModel], Awaitable[None]]
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    handler: Handler
+    payload_type: Type[BaseModel]
+    concurrency: int
+    max_retries: int
+    backoff: float
+    durable: bool
+    queue: "asyncio.Queue[_Job]" = field(init=False)
+
+    def __post_init__(self):
+        self.queue = asyncio.Queue(maxsize=TASK_QUEUE_SIZE)
+
+
+@dataclass
+class _Job:
+    payload: BaseModel
+    enqueued_at: float
+    attempt: int = 0
+    outbox_id: Optional[int] = None
+
+
+class TaskQueue:
+    """
+    Фоновая очередь задач внутри процесса.
+
+    Для каждого зарегистрированного типа задачи своя ограниченная очередь и
+    свой пул воркеров (лимит параллельности). Неудачные задачи повторяются
+    с экспоненциальной задержкой. Задачи с durable=True дополнительно пишутся
+    в таблицу task_outbox (если включен TASK_OUTBOX_ENABLED) и переживают рестарт:
+    запись outbox добавляется в транзакцию вызывающего через add_to_outbox
+    до commit, а после commit задача передается в enqueue.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, TaskSpec] = {}
+        self._workers: List[asyncio.Task] = []
+        self._pending_retries: Set[asyncio.Task] = set()
+        self._relay: Optional[asyncio.Task] = None
+        self._accepting = False
+
+    def register(
+        self,
+        name: str,
+        payload_type: Type[BaseModel],
+        concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        durable: bool = False,
+    ):
+        """
+        Декоратор регистрации обработчика задачи
+        """
+        def decorator(handler: Handler) -> Handler:
+            if name in self._specs:
+                raise ValueError(f"Task {name} is already registered")
+            spec = TaskSpec(
+                name=name,
+                handler=handler,
+                payload_type=payload_type,
+                concurrency=concurrency,
+                max_retries=max_retries,
+                backoff=backoff,
+                durable=durable,
+            )
+            self._specs[name] = spec
+            metrics.gauge(f"tasks.{name}.queue_depth", spec.queue.qsize)
+            return handler
+        return decorator
+
+    def _spec(self, name: str, payload: BaseModel) -> TaskSpec:
+        spec = self._specs[name]
+        if not isinstance(payload, spec.payload_type):
+            raise TypeError(f"Task {name} expects {spec.payload_type.__name__}")
+        return spec
+
+    def add_to_outbox(self, db: AsyncSession, name: str, payload: BaseModel) -> Optional[TaskOutbox]:
+        """
+        Добавить durable-задачу в outbox в транзакции вызывающего (до его commit):
+        задача сохраняется вместе с бизнес-данными, без отдельного запроса к БД
+        """
+        spec = self._spec(name, payload)
+        if not (spec.durable and TASK_OUTBOX_ENABLED):
+            return None
+        row = self._outbox_row(spec, payload)
+        db.add(row)
+        return row
+
+    async def enqueue(self, name: str, payload: BaseModel, outbox: Optional[TaskOutbox] = None) -> bool:
+        """
+        Поставить задачу в очередь (после commit). Не блокирует запрос: при переполнении
+        очереди обычная задача отбрасывается, а durable-задача остается в outbox.
+        outbox - строка из add_to_outbox, уже сохраненная вместе с транзакцией.
+        """
+        spec = self._spec(name, payload)
+        if not self._accepting:
+            logger.warning(f"Task queue is not running, task {name} dropped")
+            metrics.inc(f"tasks.{name}.dropped")
+            return False
+
+        job = _Job(payload=payload, enqueued_at=time.monotonic())
+        if outbox is not None:
+            job.outbox_id = outbox.id
+        elif spec.durable and TASK_OUTBOX_ENABLED:
+            # Вызывающий не добавил задачу в свою транзакцию - отдельная запись;
+            # ее ошибка не должна превращать уже выполненный запрос в 500
+            try:
+                job.outbox_id = await self._save_to_outbox(spec, payload)
+            except Exception as e:
+                logger.error(f"Failed to save task {name} to outbox: {e}")
+                metrics.inc(f"tasks.{name}.outbox_errors")
+
+        metrics.inc(f"tasks.{name}.enqueued")
+        try:
+            spec.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.inc(f"tasks.{name}.dropped")
+            if job.outbox_id is None:
+                logger.warning(f"Task queue {name} is full, task dropped")
+                return False
+            # Задачу подхватит relay из outbox после истечения аренды
+            await self._release_outbox([job.outbox_id])
+        return True
+
+    async def start(self):
+        self._accepting = True
+        for spec in self._specs.values():
+            for _ in range(spec.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(spec)))
+        if TASK_OUTBOX_ENABLED:
+            self._relay = asyncio.create_task(self._relay_outbox())
+        logger.info(f"Task queue started: {len(self._specs)} task types, {len(self._workers)} workers")
+
+    async def drain(self, timeout: float = TASK_DRAIN_TIMEOUT_SECONDS):
+        """
+        Перестать принимать задачи, дождаться выполнения очереди и остановить воркеры
+        """
+        self._accepting = False
+        if self._relay:
+            self._relay.cancel()
+
+        async def wait_all():
+            # Повторы могут вернуть задачи в очередь, поэтому ждем до полной тишины
+            while True:
+                for spec in self._specs.values():
+                    await spec.queue.join()
+                if not self._pending_retries:
+                    break
+                await asyncio.gather(*self._pending_retries, return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(wait_all(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Task queue drain timed out, unfinished tasks are left")
+
+        for task in list(self._pending_retries) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._pending_retries, *self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Вернуть в outbox задачи, которые не успели выполниться
+        leftover = []
+        for spec in self._specs.values():
+            while not spec.queue.empty():
+                job = spec.queue.get_nowait()
+                spec.queue.task_done()
+                if job.outbox_id is not None:
+                    leftover.append(job.outbox_id)
+        if leftover:
+            await self._release_outbox(leftover)
+
+    async def _worker(self, spec: TaskSpec):
+        while True:
+            job = await spec.queue.get()
+            try:
+                await self._run(spec, job)
+            finally:
+                spec.queue.task_done()
+
+    async def _run(self, spec: TaskSpec, job: _Job):
+        started = time.monotonic()
+        if job.attempt == 0:
+            metrics.observe(f"tasks.{spec.name}.wait", started - job.enqueued_at)
+        try:
+            await spec.handler(job.payload)
+        except Exception as e:
+            metrics.observe(f"tasks.{spec.name}.latency", time.monotonic() - started)
+            if job.attempt < spec.max_retries:
+                delay = spec.backoff * (2 ** job.attempt) * random.uniform(0.5, 1.5)
+                job.attempt += 1
+                metrics.inc(f"tasks.{spec.name}.retried")
+                logger.warning(f"Task {spec.name} failed ({e}), retry {job.attempt} in {delay:.2f}s")
+                retry = asyncio.create_task(self._retry_later(spec, job, delay))
+                self._pending_retries.add(retry)
+                retry.add_done_callback(self._pending_retries.discard)
+                return
+            metrics.inc(f"tasks.{spec.name}.failed")
+            logger.error(f"Task {spec.name} failed after {job.attempt + 1} attempts: {e}")
+            if job.outbox_id is not None:
+                await self._fail_outbox(job.outbox_id, str(e))
+            return
+
+        metrics.observe(f"tasks.{spec.name}.latency", time.monotonic() - started)
+        metrics.inc(f"tasks.{spec.name}.succeeded")
+        if job.outbox_id is not None:
+            await self._delete_outbox(job.outbox_id)
+
+    async def _retry_later(self, spec: TaskSpec, job: _Job, delay: float):
+        await asyncio.sleep(delay)
+        # Повтор ждет свободного места, а не отбрасывается
+        await spec.queue.put(job)
+
+    @staticmethod
+    def _outbox_row(spec: TaskSpec, payload: BaseModel) -> TaskOutbox:
+        # Аренда: relay не заберет задачу, пока ее выполняет этот экземпляр
+        return TaskOutbox(
+            task_name=spec.name,
+            payload=payload.model_dump_json(),
+            locked_until=datetime.utcnow() + timedelta(seconds=TASK_OUTBOX_LEASE_SECONDS),
+        )
+
+    async def _save_to_outbox(self, spec: TaskSpec, payload: BaseModel) -> int:
+        row = self._outbox_row(spec, payload)
+        async with async_session_maker() as session:
+            session.add(row)
+            await session.commit()
+            return row.id
+
+    async def _delete_outbox(self, outbox_id: int):
+        try:
+            async with async_session_maker() as session:
+                await session.execute(delete(TaskOutbox).where(TaskOutbox.id == outbox_id))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to delete outbox task {outbox_id}: {e}")
+
+    async def _fail_outbox(self, outbox_id: int, error: str):
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    update(TaskOutbox)
+                    .where(TaskOutbox.id == outbox_id)
+                    .values(status="failed", last_error=error[:1000])
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to mark outbox task {outbox_id} as failed: {e}")
+
+    async def _release_outbox(self, outbox_ids: List[int]):
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    update(TaskOutbox)
+                    .where(TaskOutbox.id.in_(outbox_ids))
+                    .values(locked_until=None)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to release outbox tasks: {e}")
+
+    async def _relay_outbox(self):
+        """
+        Периодически забирает из outbox задачи без активной аренды
+        (оставшиеся после рестарта или переполнения очереди)
+        """
+        while True:
+            try:
+                await self._relay_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {e}")
+            await asyncio.sleep(TASK_OUTBOX_POLL_SECONDS)
+
+    async def _relay_once(self):
+        free = {
+            name: spec.queue.maxsize - spec.queue.qsize()
+            for name, spec in self._specs.items()
+            if spec.durable
+        }
+        batch = sum(free.values())
+        if not batch:
+            return
+
+        now = datetime.utcnow()
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(TaskOutbox)
+                .where(
+                    TaskOutbox.status == "pending",
+                    TaskOutbox.task_name.in_(list(free)),
+                    or_(TaskOutbox.locked_until.is_(None), TaskOutbox.locked_until < now),
+                )
+                .order_by(TaskOutbox.id)
+                .limit(batch)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = []
+            for row in result.scalars().all():
+                if free[row.task_name] <= 0:
+                    continue
+                free[row.task_name] -= 1
+                row.locked_until = now + timedelta(seconds=TASK_OUTBOX_LEASE_SECONDS)
+                claimed.append(row)
+            await session.commit()
+
+        overflow = []
+        for row in claimed:
+            spec = self._specs[row.task_name]
+            job = _Job(
+                payload=spec.payload_type.model_validate_json(row.payload),
+                enqueued_at=time.monotonic(),
+                outbox_id=row.id,
+            )
+            try:
+                spec.queue.put_nowait(job)
+                metrics.inc(f"tasks.{spec.name}.relayed")
+            except asyncio.QueueFull:
+                overflow.append(row.id)
+        if overflow:
+            await self._release_outbox(overflow)
+
+
+task_queue = TaskQueue()
@@ -0,0 +1,210 @@
+from collections import deque
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_maker
+from app.metrics import metrics
+from app.models import Driver, DriverLocationHistory, DriverPosition
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних точек держим в памяти на водителя
+TRACK_BUFFER_SIZE = int(os.getenv("TRACK_BUFFER_SIZE", "64"))
+TRACK_FLUSH_INTERVAL_MS = int(os.getenv("TRACK_FLUSH_INTERVAL_MS", "1000"))
+# Минимальный интервал между точками трека в БД (прореживание)
+TRACK_HISTORY_INTERVAL_SECONDS = float(os.getenv("TRACK_HISTORY_INTERVAL_SECONDS", "30"))
+# Насколько время точек может опережать часы сервера; пакет с более поздними точками
+# сдвигается к времени сервера, иначе одна точка "из будущего" заморозила бы позицию
+TRACK_MAX_CLOCK_SKEW_SECONDS = float(os.getenv("TRACK_MAX_CLOCK_SKEW_SECONDS", "5"))
+# Предел неотправленных точек трека, если БД недоступна
+TRACK_MAX_PENDING = int(os.getenv("TRACK_MAX_PENDING", "100000"))
+
+
+@dataclass
+class Position:
+    latitude: float
+    longitude: float
+    recorded_at: datetime
+    heading: Optional[float] = None
+    speed: Optional[float] = None
+
+
+def to_naive_utc(value: Optional[datetime]) -> datetime:
+    """
+    Время как в остальных моделях: naive UTC
+    """
+    if value is None:
+        return datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class LocationTracker:
+    """
+    Прием GPS-точек водителей с отложенной записью в БД.
+
+    Точки попадают в кольцевой буфер водителя в памяти; текущая позиция
+    читается оттуда же. Фоновый flusher раз в TRACK_FLUSH_INTERVAL_MS одним
+    пакетом обновляет driver_positions и дописывает прореженный трек
+    в driver_location_history.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[int, Deque[Position]] = {}
+        self._dirty: Dict[int, Position] = {}
+        self._pending_history: List[Tuple[int, Position]] = []
+        self._last_history_at: Dict[int, datetime] = {}
+        self._known_drivers: Set[int] = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        metrics.gauge("tracking.drivers", lambda: len(self._buffers))
+        metrics.gauge("tracking.pending_history", lambda: len(self._pending_history))
+
+    async def ensure_driver(self, db: AsyncSession, driver_id: int) -> bool:
+        """
+        Проверка существования водителя; результат кешируется, чтобы не ходить в БД на каждую точку
+        """
+        if driver_id in self._known_drivers:
+            return True
+        result = await db.execute(select(Driver.id).where(Driver.id == driver_id))
+        if result.scalar_one_or_none() is None:
+            return False
+        self._known_drivers.add(driver_id)
+        return True
+
+    def record(self, driver_id: int, positions: Iterable[Position]) -> int:
+        buffer = self._buffers.get(driver_id)
+        if buffer is None:
+            buffer = self._buffers[driver_id] = deque(maxlen=TRACK_BUFFER_SIZE)
+
+        positions = list(positions)
+        if not positions:
+            return 0
+        now = datetime.utcnow()
+        # Часы телефона спешат: сдвигаем весь пакет так, чтобы последняя точка
+        # пришлась на время сервера - порядок и интервалы между точками сохраняются
+        offset = max(position.recorded_at for position in positions) - now
+        if offset > timedelta(seconds=TRACK_MAX_CLOCK_SKEW_SECONDS):
+            positions = [replace(position, recorded_at=position.recorded_at - offset) for position in positions]
+            metrics.inc("tracking.clamped_pings", len(positions))
+
+        accepted = 0
+        for position in sorted(positions, key=lambda p: p.recorded_at):
+            accepted += 1
+            latest = buffer[-1] if buffer else None
+            # Опоздавшие точки не сдвигают текущую позицию
+            if latest is not None and position.recorded_at <= latest.recorded_at:
+                continue
+            buffer.append(position)
+            self._dirty[driver_id] = position
+
+            last_history_at = self._last_history_at.get(driver_id)
+            if (
+                last_history_at is None
+                or (position.recorded_at - last_history_at).total_seconds() >= TRACK_HISTORY_INTERVAL_SECONDS
+            ):
+                self._last_history_at[driver_id] = position.recorded_at
+                self._pending_history.append((driver_id, position))
+
+        metrics.inc("tracking.pings", accepted)
+        return accepted
+
+    def current(self, driver_id: int) -> Optional[Position]:
+        buffer = self._buffers.get(driver_id)
+        return buffer[-1] if buffer else None
+
+    async def flush(self):
+        if not self._dirty and not self._pending_history:
+            return
+        # Забираем накопленное целиком; новые точки копятся уже в новых контейнерах
+        dirty, self._dirty = self._dirty, {}
+        history, self._pending_history = self._pending_history, []
+
+        started = time.perf_counter()
+        try:
+            async with async_session_maker() as session:
+                if dirty:
+                    await session.execute(self._upsert_positions(), [
+                        {
+                            "driver_id": driver_id,
+                            "latitude": position.latitude,
+                            "longitude": position.longitude,
+                            "heading": position.heading,
+                            "speed": position.speed,
+                            "recorded_at": position.recorded_at,
+                        }
+                        for driver_id, position in dirty.items()
+                    ])
+                if history:
+                    await session.execute(insert(DriverLocationHistory), [
+                        {
+                            "driver_id": driver_id,
+                            "latitude": position.latitude,
+                            "longitude": position.longitude,
+                            "recorded_at": position.recorded_at,
+                        }
+                        for driver_id, position in history
+                    ])
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to flush driver locations: {e}")
+            metrics.inc("tracking.flush_errors")
+            # Вернуть несохраненное: более свежие точки, пришедшие за время записи, важнее
+            for driver_id, position in dirty.items():
+                self._dirty.setdefault(driver_id, position)
+            self._pending_history = (history + self._pending_history)[-TRACK_MAX_PENDING:]
+            return
+
+        metrics.observe("tracking.flush", time.perf_counter() - started)
+        metrics.inc("tracking.flushed_positions", len(dirty))
+        metrics.inc("tracking.flushed_history", len(history))
+
+    @staticmethod
+    def _upsert_positions():
+        stmt = pg_insert(DriverPosition)
+        return stmt.on_conflict_do_update(
+            index_elements=[DriverPosition.driver_id],
+            set_={
+                "latitude": stmt.excluded.latitude,
+                "longitude": stmt.excluded.longitude,
+                "heading": stmt.excluded.heading,
+                "speed": stmt.excluded.speed,
+                "recorded_at": stmt.excluded.recorded_at,
+            },
+            # Другой экземпляр мог уже записать более свежую точку
+            where=DriverPosition.recorded_at < stmt.excluded.recorded_at,
+        )
+
+    async def _flush_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=TRACK_FLUSH_INTERVAL_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        self._stopping = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """
+        Остановить flusher; последняя запись происходит внутри цикла, а не прерывается
+        """
+        if self._flusher:
+            self._stopping.set()
+            await self._flusher
+            self._flusher = None
+
+
+location_tracker = LocationTracker()
@@ -0,0 +1,123 @@
+"""
+Бенчмарк движка маршрутов на синтетическом городе.
+
+Строит сетку side x side перекрестков (шаг ~120 м) со случайными скоростями,
+магистралями и удаленными участками, сохраняет в CSR-файл, загружает через
+mmap и измеряет задержку запросов: A* без кеша, попадание в LRU-кеш, матрица.
+
+    python -m loadtest.bench_routing --side 300 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app.routing import RoutingEngine, haversine_m, write_road_graph
+
+CENTER_LATITUDE = 50.45
+CENTER_LONGITUDE = 30.52
+STEP_DEG = 0.0011
+
+
+def build_city(path: str, side: int, seed: int):
+    rng = random.Random(seed)
+    latitudes, longitudes = [], []
+    for row in range(side):
+        for col in range(side):
+            latitudes.append(CENTER_LATITUDE + (row - side / 2) * STEP_DEG + rng.uniform(-1, 1) * STEP_DEG * 0.1)
+            longitudes.append(CENTER_LONGITUDE + (col - side / 2) * STEP_DEG * 1.5 + rng.uniform(-1, 1) * STEP_DEG * 0.1)
+
+    edges = []
+
+    def connect(u: int, v: int, arterial: bool):
+        length = haversine_m(latitudes[u], longitudes[u], latitudes[v], longitudes[v]) * rng.uniform(1.0, 1.2)
+        speed_kmh = rng.uniform(50, 70) if arterial else rng.uniform(20, 40)
+        duration = length / (speed_kmh / 3.6)
+        edges.append((u, v, length, duration))
+        edges.append((v, u, length, duration))
+
+    for row in range(side):
+        for col in range(side):
+            node = row * side + col
+            # Около 3% участков перекрыто
+            if col + 1 < side and rng.random() > 0.03:
+                connect(node, node + 1, arterial=row % 10 == 0)
+            if row + 1 < side and rng.random() > 0.03:
+                connect(node, node + side, arterial=col % 10 == 0)
+
+    write_road_graph(path, latitudes, longitudes, edges)
+    return latitudes, longitudes
+
+
+def report(name: str, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+    print(
+        f"{name:<24} n={len(samples):<6} mean={statistics.mean(samples) * 1000:8.2f}ms "
+        f"p50={statistics.median(samples) * 1000:8.2f}ms p99={p99 * 1000:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--side", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--matrix", type=int, default=10)
+    parser.add_argument("--matrix-max-duration", type=float, default=900.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "city.graph")
+        started = time.perf_counter()
+        latitudes, longitudes = build_city(path, args.side, args.seed)
+        print(f"Built {len(latitudes)} nodes in {time.perf_counter() - started:.1f}s, "
+              f"file {os.path.getsize(path) / 1e6:.1f} MB")
+
+        engine = RoutingEngine()
+        started = time.perf_counter()
+        engine.load(path)
+        print(f"Loaded in {time.perf_counter() - started:.2f}s")
+
+        rng = random.Random(args.seed + 1)
+
+        def random_point():
+            node = rng.randrange(len(latitudes))
+            return latitudes[node] + rng.uniform(-1, 1) * 1e-4, longitudes[node] + rng.uniform(-1, 1) * 1e-4
+
+        pairs = [(random_point(), random_point()) for _ in range(args.queries)]
+
+        samples = []
+        for (from_lat, from_lon), (to_lat, to_lon) in pairs:
+            started = time.perf_counter()
+            engine.route(from_lat, from_lon, to_lat, to_lon)
+            samples.append(time.perf_counter() - started)
+        report("A* (cold)", samples)
+
+        samples = []
+        for (from_lat, from_lon), (to_lat, to_lon) in pairs:
+            started = time.perf_counter()
+            engine.route(from_lat, from_lon, to_lat, to_lon)
+            samples.append(time.perf_counter() - started)
+        report("A* (LRU hit)", samples)
+
+        # Диспетчеризация: водители вокруг заказов в радиусе нескольких километров
+        samples = []
+        for _ in range(max(1, args.queries // 20)):
+            center_lat, center_lon = random_point()
+
+            def nearby():
+                return center_lat + rng.uniform(-0.02, 0.02), center_lon + rng.uniform(-0.03, 0.03)
+
+            sources = [nearby() for _ in range(args.matrix)]
+            targets = [nearby() for _ in range(args.matrix)]
+            started = time.perf_counter()
+            engine.matrix(sources, targets, args.matrix_max_duration)
+            samples.append(time.perf_counter() - started)
+        report(f"matrix {args.matrix}x{args.matrix} (<{args.matrix_max_duration:.0f}s)", samples)
+
+
+if __name__ == "__main__":
+    main()
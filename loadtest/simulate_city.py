@@ -0,0 +1,385 @@
+"""
+Сценарная нагрузка "город": полный жизненный цикл поездки.
+
+Виртуальные пассажиры создают поездки с заданной интенсивностью (пуассоновский
+поток), опрашивают их, получают водителя через PATCH /rides/{id}, завершают
+или отменяют поездку и платят через POST /payments/. Параллельно сотрудники
+офиса листают водителей и автомобили. Интенсивность можно поднимать ступенями,
+чтобы найти точку, где сервис перестает справляться.
+
+По умолчанию приложение поднимается в этом же процессе (httpx.ASGITransport)
+поверх локальной БД из DATABASE_URL, что позволяет снимать заполненность пула
+соединений. С --base-url нагрузка идет на уже запущенный сервис.
+
+    python -m loadtest.simulate_city --riders 2000 --drivers 500 --rate 50 --duration 600
+    python -m loadtest.simulate_city --rate 20 --ramp-step 20 --ramp-interval 60 --duration 900
+"""
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+
+@dataclass
+class SimulationConfig:
+    riders: int = 1000
+    drivers: int = 200
+    backoffice_users: int = 5
+    rate: float = 20.0  # новых поездок в секунду
+    ramp_step: float = 0.0  # прибавка к rate на каждой ступени
+    ramp_interval: float = 60.0
+    duration: float = 300.0
+    poll_interval: float = 2.0
+    pickup_wait: float = 5.0  # сколько пассажир ждет водителя до назначения
+    trip_duration: float = 20.0
+    cancel_probability: float = 0.1
+    pay_probability: float = 0.9
+    backoffice_interval: float = 1.0
+    report_interval: float = 10.0
+    max_error_rate: float = 0.05  # порог "сервис упал" для ступени
+    max_p99_ms: float = 2000.0
+    setup_concurrency: int = 20
+    base_url: Optional[str] = None
+
+
+class Stats:
+    """
+    Задержки и ошибки по шагам жизненного цикла, общие и за текущий интервал
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.window_latencies: Dict[str, List[float]] = defaultdict(list)
+        self.window_errors: Dict[str, int] = defaultdict(int)
+        self.rides_started = 0
+        self.rides_finished = 0
+        self.skipped_arrivals = 0  # все пассажиры заняты, нужно больше --riders
+        self.pool_samples: List[float] = []
+
+    def record(self, step: str, seconds: float, ok: bool):
+        self.latencies[step].append(seconds)
+        self.window_latencies[step].append(seconds)
+        if not ok:
+            self.errors[step] += 1
+            self.window_errors[step] += 1
+
+    def reset_window(self):
+        self.window_latencies = defaultdict(list)
+        self.window_errors = defaultdict(int)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class CitySimulation:
+    def __init__(self, config: SimulationConfig, client: httpx.AsyncClient, pool=None):
+        self.config = config
+        self.client = client
+        self.pool = pool
+        self.stats = Stats()
+        self.rider_tokens: List[str] = []
+        self.idle_riders: "asyncio.Queue[str]" = asyncio.Queue()
+        self.idle_drivers: "asyncio.Queue[int]" = asyncio.Queue()
+        self.backoffice_token: Optional[str] = None
+        self.current_rate = config.rate
+        self.running = True
+        self.started_at = 0.0
+
+    async def call(self, step: str, method: str, url: str, token: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+        except httpx.HTTPError:
+            self.stats.record(step, time.perf_counter() - started, ok=False)
+            return None
+        self.stats.record(step, time.perf_counter() - started, ok=response.status_code < 400)
+        return response if response.status_code < 400 else None
+
+    # Подготовка: пользователи, водители, автомобили
+    async def register(self, prefix: str) -> Optional[str]:
+        username = f"{prefix}_{uuid.uuid4().hex[:12]}"
+        password = "simulation"
+        response = await self.client.post("/auth/register", json={
+            "username": username,
+            "email": f"{username}@sim.example.com",
+            "password": password,
+        })
+        if response.status_code >= 400:
+            return None
+        response = await self.client.post(
+            "/auth/login", data={"username": username, "password": password}
+        )
+        if response.status_code >= 400:
+            return None
+        return response.json()["access_token"]
+
+    async def setup(self):
+        semaphore = asyncio.Semaphore(self.config.setup_concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                return await coro
+
+        print(f"Registering {self.config.riders} riders...", file=sys.stderr)
+        tokens = await asyncio.gather(*(
+            limited(self.register("rider")) for _ in range(self.config.riders)
+        ))
+        self.rider_tokens = [token for token in tokens if token]
+        for token in self.rider_tokens:
+            self.idle_riders.put_nowait(token)
+
+        self.backoffice_token = await self.register("office")
+        if not self.rider_tokens or not self.backoffice_token:
+            raise RuntimeError("Failed to register simulation users")
+
+        async def create_driver(index: int):
+            suffix = uuid.uuid4().hex[:10]
+            response = await self.client.post("/drivers/", json={
+                "name": f"Driver {index}",
+                "phone": f"+380{suffix}",
+                "license_number": f"SIM-{suffix}",
+            }, headers={"Authorization": f"Bearer {self.backoffice_token}"})
+            if response.status_code >= 400:
+                return
+            driver_id = response.json()["id"]
+            await self.client.post("/cars/", json={
+                "driver_id": driver_id,
+                "model": "Skoda Octavia",
+                "plate_number": f"SIM{suffix}".upper(),
+            }, headers={"Authorization": f"Bearer {self.backoffice_token}"})
+            self.idle_drivers.put_nowait(driver_id)
+
+        print(f"Creating {self.config.drivers} drivers...", file=sys.stderr)
+        await asyncio.gather(*(
+            limited(create_driver(i)) for i in range(self.config.drivers)
+        ))
+
+    # Машины состояний
+    async def ride_lifecycle(self, token: str):
+        config = self.config
+        self.stats.rides_started += 1
+        try:
+            response = await self.call("create_ride", "POST", "/rides/", token, json={
+                "pickup_location": f"Street {random.randint(1, 500)}",
+                "dropoff_location": f"Avenue {random.randint(1, 500)}",
+            })
+            if response is None:
+                return
+            ride_id = response.json()["id"]
+
+            # Ожидание водителя: пассажир опрашивает поездку
+            driver_id = None
+            deadline = time.monotonic() + config.pickup_wait
+            while driver_id is None and time.monotonic() < deadline:
+                await self.call("poll_ride", "GET", f"/rides/{ride_id}", token)
+                try:
+                    driver_id = await asyncio.wait_for(
+                        self.idle_drivers.get(), timeout=config.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+            if driver_id is None or random.random() < config.cancel_probability:
+                await self.call("cancel_ride", "DELETE", f"/rides/{ride_id}", token)
+                if driver_id is not None:
+                    self.idle_drivers.put_nowait(driver_id)
+                return
+
+            try:
+                price = round(random.uniform(80, 400), 2)
+                response = await self.call(
+                    "assign_driver", "PATCH", f"/rides/{ride_id}", token,
+                    json={"driver_id": driver_id, "status": "in_progress", "price": price},
+                )
+                if response is None:
+                    return
+
+                trip_end = time.monotonic() + random.expovariate(1 / config.trip_duration)
+                while time.monotonic() < trip_end:
+                    await asyncio.sleep(min(config.poll_interval, max(0.0, trip_end - time.monotonic())))
+                    await self.call("poll_ride", "GET", f"/rides/{ride_id}", token)
+
+                response = await self.call(
+                    "complete_ride", "PATCH", f"/rides/{ride_id}", token,
+                    json={"status": "completed"},
+                )
+                if response is None:
+                    return
+                amount = response.json().get("price") or price
+            finally:
+                self.idle_drivers.put_nowait(driver_id)
+
+            if random.random() < config.pay_probability:
+                await self.call("pay", "POST", "/payments/", token, json={
+                    "ride_id": ride_id,
+                    "amount": amount,
+                    "payment_method": random.choice(["card", "cash"]),
+                })
+            self.stats.rides_finished += 1
+        finally:
+            self.idle_riders.put_nowait(token)
+
+    async def arrivals(self):
+        """
+        Пуассоновский поток новых поездок от свободных пассажиров
+        """
+        tasks = set()
+        while self.running:
+            await asyncio.sleep(random.expovariate(self.current_rate))
+            try:
+                token = self.idle_riders.get_nowait()
+            except asyncio.QueueEmpty:
+                self.stats.skipped_arrivals += 1
+                continue
+            task = asyncio.create_task(self.ride_lifecycle(token))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def backoffice(self):
+        while self.running:
+            await asyncio.sleep(random.expovariate(1 / self.config.backoffice_interval))
+            if random.random() < 0.5:
+                await self.call("list_drivers", "GET", "/drivers/", self.backoffice_token,
+                                params={"limit": 50, "available_only": random.random() < 0.5})
+            else:
+                await self.call("list_cars", "GET", "/cars/", self.backoffice_token,
+                                params={"limit": 50})
+
+    async def sample_pool(self):
+        if self.pool is None:
+            return
+        capacity = self.pool.size() + max(getattr(self.pool, "_max_overflow", 0), 0)
+        while self.running:
+            self.stats.pool_samples.append(self.pool.checkedout() / capacity if capacity else 0.0)
+            await asyncio.sleep(0.5)
+
+    async def ramp(self):
+        if not self.config.ramp_step:
+            return
+        while self.running:
+            await asyncio.sleep(self.config.ramp_interval)
+            self.current_rate += self.config.ramp_step
+
+    async def reporter(self):
+        """
+        Отчет за интервал; ступень считается провальной по ошибкам или p99
+        """
+        header = f"{'t,s':>6} {'rate':>7} {'req/s':>8} {'p50ms':>8} {'p99ms':>8} {'err%':>6} {'pool%':>6}"
+        print(header)
+        last_pool = 0
+        while self.running:
+            await asyncio.sleep(self.config.report_interval)
+            window = [v for values in self.stats.window_latencies.values() for v in values]
+            errors = sum(self.stats.window_errors.values())
+            requests = len(window)
+            error_rate = errors / requests if requests else 0.0
+            p99_ms = percentile(window, 0.99) * 1000
+            pool = self.stats.pool_samples[last_pool:]
+            last_pool = len(self.stats.pool_samples)
+            pool_pct = max(pool) * 100 if pool else 0.0
+            print(
+                f"{time.monotonic() - self.started_at:6.0f} {self.current_rate:7.1f} "
+                f"{requests / self.config.report_interval:8.1f} {percentile(window, 0.5) * 1000:8.1f} "
+                f"{p99_ms:8.1f} {error_rate * 100:6.2f} {pool_pct:6.1f}"
+            )
+            if error_rate > self.config.max_error_rate or p99_ms > self.config.max_p99_ms:
+                print(f"  ! degraded at {self.current_rate:.1f} rides/s")
+            self.stats.reset_window()
+
+    async def run(self):
+        await self.setup()
+        self.started_at = time.monotonic()
+        workers = [
+            asyncio.create_task(self.backoffice())
+            for _ in range(self.config.backoffice_users)
+        ]
+        workers += [
+            asyncio.create_task(self.sample_pool()),
+            asyncio.create_task(self.ramp()),
+            asyncio.create_task(self.reporter()),
+        ]
+        arrivals = asyncio.create_task(self.arrivals())
+        await asyncio.sleep(self.config.duration)
+        self.running = False
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Дать начатым поездкам завершиться
+        await arrivals
+        self.summary(time.monotonic() - self.started_at)
+
+    def summary(self, elapsed: float):
+        stats = self.stats
+        total = sum(len(values) for values in stats.latencies.values())
+        print()
+        print(f"Elapsed {elapsed:.0f}s, {total} requests, {total / elapsed:.1f} req/s, "
+              f"rides started {stats.rides_started}, finished {stats.rides_finished}, "
+              f"skipped (no idle rider) {stats.skipped_arrivals}")
+        print(f"{'step':<16} {'count':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8} {'err%':>6}")
+        for step, values in sorted(stats.latencies.items()):
+            errors = stats.errors.get(step, 0)
+            print(
+                f"{step:<16} {len(values):8d} {percentile(values, 0.5) * 1000:8.1f} "
+                f"{percentile(values, 0.95) * 1000:8.1f} {percentile(values, 0.99) * 1000:8.1f} "
+                f"{max(values) * 1000:8.1f} {errors / len(values) * 100:6.2f}"
+            )
+        if stats.pool_samples:
+            print(f"DB pool saturation: avg {sum(stats.pool_samples) / len(stats.pool_samples) * 100:.1f}%, "
+                  f"max {max(stats.pool_samples) * 100:.1f}%")
+
+
+async def main(config: SimulationConfig):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(30.0)
+    async with AsyncExitStack() as stack:
+        pool = None
+        if config.base_url:
+            client = httpx.AsyncClient(base_url=config.base_url, limits=limits, timeout=timeout)
+        else:
+            from app.main import app, lifespan
+            from app.database import engine
+
+            await stack.enter_async_context(lifespan(app))
+            client = httpx.AsyncClient(
+                # Ошибки приложения считаем ответами 500, а не исключениями клиента
+                transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                base_url="http://simulation",
+                limits=limits,
+                timeout=timeout,
+            )
+            pool = engine.pool
+        await stack.enter_async_context(client)
+        await CitySimulation(config, client, pool).run()
+
+
+def parse_args() -> SimulationConfig:
+    defaults = SimulationConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, value in vars(defaults).items():
+        flag = "--" + name.replace("_", "-")
+        if name == "base_url":
+            parser.add_argument(flag, default=None)
+        else:
+            parser.add_argument(flag, type=type(value), default=value)
+    return SimulationConfig(**vars(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,58 @@
+"""
+Предобработка графа дорог в бинарный CSR-файл для ROAD_GRAPH_PATH.
+
+nodes.csv: id,latitude,longitude
+edges.csv: source,target[,length_m][,duration_s][,speed_kmh][,oneway]
+
+Если length_m не задан, берется расстояние по прямой; если не задан duration_s,
+время считается из speed_kmh (или --default-speed). Ребра с oneway=0/false
+добавляются в обе стороны.
+
+    python -m scripts.build_road_graph nodes.csv edges.csv city.graph
+"""
+import argparse
+import csv
+
+from app.routing import haversine_m, write_road_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("nodes")
+    parser.add_argument("edges")
+    parser.add_argument("output")
+    parser.add_argument("--default-speed", type=float, default=40.0, help="km/h")
+    args = parser.parse_args()
+
+    index = {}
+    latitudes, longitudes = [], []
+    with open(args.nodes, newline="") as f:
+        for row in csv.DictReader(f):
+            index[row["id"]] = len(latitudes)
+            latitudes.append(float(row["latitude"]))
+            longitudes.append(float(row["longitude"]))
+
+    edges = []
+    with open(args.edges, newline="") as f:
+        for row in csv.DictReader(f):
+            source, target = index[row["source"]], index[row["target"]]
+            length = row.get("length_m")
+            length = float(length) if length else haversine_m(
+                latitudes[source], longitudes[source], latitudes[target], longitudes[target]
+            )
+            duration = row.get("duration_s")
+            if duration:
+                duration = float(duration)
+            else:
+                speed = float(row.get("speed_kmh") or args.default_speed)
+                duration = length / (speed / 3.6)
+            edges.append((source, target, length, duration))
+            if (row.get("oneway") or "1").strip().lower() in ("0", "false", "no"):
+                edges.append((target, source, length, duration))
+
+    write_road_graph(args.output, latitudes, longitudes, edges)
+    print(f"{args.output}: {len(latitudes)} nodes, {len(edges)} edges")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+-- Обновление существующей базы до текущих моделей (PostgreSQL).
+-- create_all создает только отсутствующие таблицы (driver_positions,
+-- driver_location_history, surge_counters, task_outbox), но не добавляет
+-- колонки и индексы в уже существующие. Скрипт идемпотентен.
+--
+--     psql "$DATABASE_URL" -f scripts/upgrade_schema.sql
+
+BEGIN;
+
+-- Координаты подачи и surge-множитель поездки
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS pickup_latitude double precision;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS pickup_longitude double precision;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS surge_multiplier double precision;
+
+-- Счетчики изменений строк для ETag
+ALTER TABLE drivers ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+ALTER TABLE cars ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+-- Очередь ожидающих поездок для claim-next
+CREATE INDEX IF NOT EXISTS ix_rides_status_created_at ON rides (status, created_at);
+-- Проверка версий списков поездок и платежей пользователя
+CREATE INDEX IF NOT EXISTS ix_rides_user_id_id_version ON rides (user_id, id, version);
+CREATE INDEX IF NOT EXISTS ix_payments_user_id_id_version ON payments (user_id, id, version);
+
+COMMIT;
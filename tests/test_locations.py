@@ -0,0 +1,38 @@
+from app.locations import LocationIndex, SUGGEST_SCAN_LIMIT
+
+
+def test_frequent_place_wins_for_short_prefix():
+    index = LocationIndex()
+    for number in range(SUGGEST_SCAN_LIMIT + 100):
+        index.add(f"Street {number}")
+    index.add("Street 9999", count=10000)
+
+    assert index.suggest("st", limit=1) == [("Street 9999", 10000)]
+    assert index.suggest("street", limit=1) == [("Street 9999", 10000)]
+
+
+def test_top_follows_growing_counts():
+    index = LocationIndex()
+    for number in range(SUGGEST_SCAN_LIMIT + 100):
+        index.add(f"Street {number}")
+    index.add("Street 42", count=5)
+    index.add("Street 7", count=3)
+
+    assert [label for label, _ in index.suggest("s", limit=2)] == ["Street 42", "Street 7"]
+
+    index.add("Street 7", count=10)
+
+    assert [label for label, _ in index.suggest("s", limit=2)] == ["Street 7", "Street 42"]
+
+
+def test_recent_place_of_user_is_boosted():
+    index = LocationIndex()
+    for number in range(SUGGEST_SCAN_LIMIT + 100):
+        index.add(f"Street {number}", count=2)
+    index.add("Street 1", user_id=7)
+    index.add("Street 500", user_id=7)
+    index.add("Street 600", count=100)
+
+    assert [label for label, _ in index.suggest("st", user_id=7, limit=3)] == [
+        "Street 500", "Street 1", "Street 600"
+    ]
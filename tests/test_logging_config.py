@@ -0,0 +1,61 @@
+import logging
+import queue
+import threading
+import time
+
+from app.logging_config import DrainingQueueListener
+
+
+class StalledHandler(logging.Handler):
+    def __init__(self, release: threading.Event):
+        super().__init__()
+        self.unblocked = release
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        self.unblocked.wait()
+        self.records.append(record)
+
+
+def make_record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+
+
+def fill_behind_stalled_handler(release: threading.Event, size: int = 3):
+    log_queue = queue.Queue(maxsize=size)
+    handler = StalledHandler(release)
+    listener = DrainingQueueListener(log_queue, handler, stop_timeout=0.1)
+    listener.start()
+    log_queue.put_nowait(make_record("first"))
+    # Дождаться, пока поток заберет первую запись и застрянет в обработчике
+    while not log_queue.empty():
+        time.sleep(0.01)
+    for i in range(size):
+        log_queue.put_nowait(make_record(f"queued {i}"))
+    return listener, handler
+
+
+def test_stop_waits_for_space_in_full_queue():
+    release = threading.Event()
+    listener, handler = fill_behind_stalled_handler(release)
+    listener.stop_timeout = 2
+    threading.Timer(0.05, release.set).start()
+
+    listener.stop()
+
+    assert [record.msg for record in handler.records] == ["first", "queued 0", "queued 1", "queued 2"]
+
+
+def test_stop_drops_oldest_records_when_queue_stays_full():
+    release = threading.Event()
+    listener, handler = fill_behind_stalled_handler(release)
+    threading.Timer(0.3, release.set).start()
+    thread = listener._thread
+
+    listener.stop()
+
+    assert listener._thread is None
+    thread.join(2)
+    assert handler.records[0].msg == "first"
+    assert "queued 2" in [record.msg for record in handler.records]
+    assert "queued 0" not in [record.msg for record in handler.records]
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from app.routing import RoutingEngine, haversine_m, write_road_graph
+
+
+def build_graph(path, seed: int, size: int = 8):
+    """
+    Решетка size x size со случайными односторонними ребрами и скоростями
+    плюс отдельная компонента, недостижимая из основной
+    """
+    rng = random.Random(seed)
+    latitudes, longitudes = [], []
+    for row in range(size):
+        for col in range(size):
+            latitudes.append(50.0 + row * 0.002 + rng.uniform(-0.0004, 0.0004))
+            longitudes.append(30.0 + col * 0.003 + rng.uniform(-0.0006, 0.0006))
+    island = len(latitudes)
+    for i in range(3):
+        latitudes.append(50.1 + i * 0.002)
+        longitudes.append(30.1)
+
+    edges = []
+
+    def connect(u: int, v: int):
+        length = haversine_m(latitudes[u], longitudes[u], latitudes[v], longitudes[v]) * rng.uniform(1.0, 1.3)
+        edges.append((u, v, length, length / rng.uniform(5, 20)))
+
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            neighbours = []
+            if col + 1 < size:
+                neighbours.append(node + 1)
+            if row + 1 < size:
+                neighbours.append(node + size)
+            for other in neighbours:
+                direction = rng.random()
+                if direction < 0.6:
+                    connect(node, other)
+                    connect(other, node)
+                elif direction < 0.8:
+                    connect(node, other)
+                elif direction < 0.95:
+                    connect(other, node)
+    connect(island, island + 1)
+    connect(island + 1, island + 2)
+
+    write_road_graph(str(path), latitudes, longitudes, edges)
+    return latitudes, longitudes
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_route_matches_dijkstra(tmp_path, seed):
+    path = tmp_path / "city.graph"
+    latitudes, longitudes = build_graph(path, seed)
+    engine = RoutingEngine()
+    engine.load(str(path))
+
+    unreachable = 0
+    for source in range(len(latitudes)):
+        for target in range(len(latitudes)):
+            expected = engine._one_to_many(source, {target}, engine.graph.forward).get(target)
+            route = engine.route(latitudes[source], longitudes[source], latitudes[target], longitudes[target])
+            if expected is None:
+                unreachable += 1
+                assert route is None
+            else:
+                assert route == pytest.approx(expected, rel=1e-6, abs=1e-6)
+
+    assert unreachable > 0
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.surge import CITY_ZONE, SurgeEngine, SurgeStore
+
+
+def make_engine(available_drivers=()) -> SurgeEngine:
+    engine = SurgeEngine(SurgeStore())
+
+    async def refresh_available():
+        engine._available_drivers = set(available_drivers)
+
+    engine._refresh_available = refresh_available
+    return engine
+
+
+def run_ticks(engine: SurgeEngine, count: int):
+    async def ticks():
+        for _ in range(count):
+            await engine.tick()
+
+    asyncio.run(ticks())
+
+
+def test_multiplier_decays_back_to_base_price():
+    engine = make_engine()
+    engine._multipliers[CITY_ZONE] = 1.5
+
+    run_ticks(engine, 50)
+
+    assert engine._multipliers[CITY_ZONE] == 1.0
+    assert engine.multiplier() == 1.0
+
+
+def test_multiplier_converges_to_target():
+    # 4 заказа на 2 водителей: 1 + 0.5 * (2 - 1) = 1.5
+    engine = make_engine(available_drivers=[1, 2])
+    for _ in range(4):
+        engine.record_demand(None, None)
+
+    run_ticks(engine, 50)
+
+    assert engine._multipliers[CITY_ZONE] == pytest.approx(1.5)
+    assert engine.multiplier() == 1.5
+
+
+def test_multiplier_is_capped():
+    engine = make_engine(available_drivers=[1])
+    for _ in range(100):
+        engine.record_demand(None, None)
+
+    run_ticks(engine, 50)
+
+    assert engine.multiplier() == 3.0
+
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from app.tracking import LocationTracker, Position
+
+
+def test_future_ping_does_not_freeze_position():
+    tracker = LocationTracker()
+    now = datetime.utcnow()
+    tracker.record(1, [Position(latitude=50.0, longitude=30.0, recorded_at=now.replace(year=2100))])
+
+    assert tracker.current(1).recorded_at < now + timedelta(minutes=1)
+
+    later = datetime.utcnow() + timedelta(seconds=1)
+    tracker.record(1, [Position(latitude=50.1, longitude=30.1, recorded_at=later)])
+
+    assert tracker.current(1).latitude == 50.1
+
+
+def test_late_ping_does_not_move_position():
+    tracker = LocationTracker()
+    now = datetime.utcnow()
+    tracker.record(1, [Position(latitude=50.1, longitude=30.1, recorded_at=now)])
+    tracker.record(1, [Position(latitude=50.0, longitude=30.0, recorded_at=now - timedelta(seconds=10))])
+
+    assert tracker.current(1).latitude == 50.1
+
+
+def test_fast_clock_batch_keeps_order_and_spacing():
+    tracker = LocationTracker()
+    phone_now = datetime.utcnow() + timedelta(minutes=2)
+    pings = [
+        Position(latitude=50.0 + i / 100, longitude=30.0, recorded_at=phone_now - timedelta(seconds=9 - i))
+        for i in range(10)
+    ]
+
+    assert tracker.record(1, pings) == 10
+
+    buffer = list(tracker._buffers[1])
+    assert len(buffer) == 10
+    assert tracker.current(1).latitude == 50.09
+    assert tracker.current(1).recorded_at <= datetime.utcnow()
+    assert [b.recorded_at - a.recorded_at for a, b in zip(buffer, buffer[1:])] == [timedelta(seconds=1)] * 9